@@ -0,0 +1,116 @@
+from asgiref.sync import sync_to_async
+from rest_framework.authentication import (
+    TokenAuthentication,
+    get_authorization_header,
+)
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+from .cache import aget_versions, make_etag, response_cache_key
+
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def get_token_user(key):
+    token = Token.objects.select_related('user').filter(key=key).first()
+    if token is None or not token.user.is_active:
+        return None
+    return token
+
+
+async def authenticate(request):
+    """Async counterpart of ``TokenAuthentication``.
+
+    Returns the token, ``AnonymousUser`` without credentials, or None when
+    the credentials are not valid, leaving the error to the sync view.
+    """
+    auth = get_authorization_header(request).split()
+    if not auth:
+        return AnonymousUser()
+    if len(auth) != 2 or auth[0].lower() != b'token':
+        return None
+    try:
+        key = auth[1].decode()
+    except UnicodeError:
+        return None
+    return await sync_to_async(get_token_user)(key)
+
+
+class CheckedTokenAuthentication(TokenAuthentication):
+    """Reuses the token the async view has looked up, if any.
+
+    Listed before the viewset's own classes; without a checked token it
+    leaves the request to them.
+    """
+
+    def authenticate(self, request):
+        return getattr(request, 'checked_token_auth', None)
+
+
+async def cached_read(viewset, request, user):
+    """Answers from the versions and the response cache alone, or None.
+
+    Mirrors ``ConditionalGetMixin`` without leaving the event loop, so
+    revalidations and cache hits don't take a thread or a connection.
+    """
+    etag = make_etag(
+        request.build_absolute_uri(),
+        user.pk if viewset.user_dependent else None,
+        await aget_versions(*viewset.get_version_names(user)),
+    )
+    response = get_conditional_response(request, etag=etag)
+    if response is None and viewset.can_cache_response(user):
+        data = await cache.aget(response_cache_key(etag))
+        if data is not None:
+            response = HttpResponse(
+                JSONRenderer().render(data),
+                content_type=JSONRenderer.media_type,
+            )
+    if response is None:
+        return None
+    return viewset.add_etag(response, etag)
+
+
+def accepts_json(request):
+    """The browsable API and format suffixes are left to DRF."""
+    return (
+        'format' not in request.GET
+        and 'text/html' not in request.headers.get('Accept', '')
+    )
+
+
+def async_read_view(viewset, actions, **initkwargs):
+    """Serves the viewset from an async view for ASGI deployments.
+
+    Reads are answered in the event loop when the ETag or the response
+    cache allow it. Everything else, including all writes, runs
+    the regular DRF view in the request's worker thread: Django 4.0 has no
+    async ORM, so database work still happens in sync code.
+    """
+    sync_view = sync_to_async(viewset.as_view(actions, **{
+        'authentication_classes': [
+            CheckedTokenAuthentication, *viewset.authentication_classes
+        ],
+        **initkwargs,
+    }))
+
+    async def view(request, *args, **kwargs):
+        if request.method in READ_METHODS and accepts_json(request):
+            auth = await authenticate(request)
+            if auth is not None:
+                user = getattr(auth, 'user', auth)
+                response = await cached_read(viewset, request, user)
+                if response is not None:
+                    return response
+                if user.is_authenticated:
+                    request.checked_token_auth = (user, auth)
+        return await sync_view(request, *args, **kwargs)
+
+    view.csrf_exempt = True
+    view.actions = actions
+    return view
@@ -0,0 +1,151 @@
+import hashlib
+import time
+
+from rest_framework.response import Response
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+
+def version_key(name):
+    return f'version:{name}'
+
+
+def user_version_name(user_id):
+    return f'user:{user_id}'
+
+
+def get_versions(*names):
+    """Returns the change timestamps of the named data sets.
+
+    Names are model labels or per-user names for the collections of a user.
+    A missing version (first use, evicted key) starts at the current time,
+    which can only cause a miss, never stale data.
+    """
+    keys = [version_key(name) for name in names]
+    versions = cache.get_many(keys)
+    missing = {key: time.time() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+async def aget_versions(*names):
+    keys = [version_key(name) for name in names]
+    versions = await cache.aget_many(keys)
+    missing = {key: time.time() for key in keys if key not in versions}
+    if missing:
+        await cache.aset_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def versions_digest(*models):
+    """Short digest of the versions of the models, for use in cache keys."""
+    versions = get_versions(*(model._meta.label_lower for model in models))
+    return hashlib.md5(repr(versions).encode()).hexdigest()[:12]
+
+
+def bump_versions(*names):
+    cache.set_many(
+        {version_key(name): time.time() for name in names}, timeout=None
+    )
+
+
+def make_etag(url, user_id, versions):
+    """ETag of a response built from the versions.
+
+    The URL is absolute: serialized image and pagination links are built
+    from the request's scheme and host, which clients choose, so responses
+    to one host must not be served to another.
+
+    No Last-Modified goes with it: rounded to whole seconds, it would
+    answer If-Modified-Since with 304 after a second write in the same
+    second, while the ETag changes with every version.
+    """
+    digest = hashlib.md5(
+        repr((url, user_id, versions)).encode()
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+def response_cache_key(etag):
+    return f'response:{etag}'
+
+
+class ConditionalGetMixin:
+    """Answers conditional ``list``/``retrieve`` requests without serializing.
+
+    The ETag comes from the versions of ``version_models``; with
+    ``user_dependent`` it also varies by the authenticated user and that
+    user's collections.
+
+    With ``cache_responses`` the serialized data is also kept in the cache
+    under the ETag, for anonymous requests only if ``user_dependent``.
+    Any change bumps a version and thus the key, so entries never go stale;
+    the timeout only bounds how long unreachable ones are kept.
+    """
+
+    version_models = ()
+    user_dependent = False
+    cache_responses = False
+
+    @classmethod
+    def get_version_names(cls, user):
+        names = [model._meta.label_lower for model in cls.version_models]
+        if cls.user_dependent and user.is_authenticated:
+            names.append(user_version_name(user.pk))
+        return names
+
+    def get_etag(self, request):
+        return make_etag(
+            request.build_absolute_uri(),
+            request.user.pk if self.user_dependent else None,
+            get_versions(*self.get_version_names(request.user)),
+        )
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = self.cached_response(
+                etag, handler, request, *args, **kwargs
+            )
+        return self.add_etag(response, etag)
+
+    @classmethod
+    def add_etag(cls, response, etag):
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if cls.user_dependent:
+                patch_vary_headers(response, ['Authorization'])
+        return response
+
+    @classmethod
+    def can_cache_response(cls, user):
+        return cls.cache_responses and not (
+            cls.user_dependent and user.is_authenticated
+        )
+
+    def cached_response(self, etag, handler, request, *args, **kwargs):
+        if not self.can_cache_response(request.user):
+            return handler(request, *args, **kwargs)
+        key = response_cache_key(etag)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Cache versions must be seen by every web worker and ``run_worker``."""
+    if not settings.CACHES['default']['BACKEND'].endswith('LocMemCache'):
+        return []
+    return [
+        Warning(
+            'The default cache is local to each process: writes handled by '
+            'one process leave stale ETags and cached responses in others.',
+            hint='Point CACHE_URL to a shared cache, e.g. '
+                 'dbcache://cache_table after manage.py createcachetable.',
+            id='api.W001',
+        )
+    ]
@@ -0,0 +1,374 @@
+import base64
+import io
+import json
+import statistics
+import subprocess
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import F
+from django.test import Client, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, resolve
+
+from monitoring.queries import QueryCounter
+from recipes.models import Ingredient, Recipe, ShoppingCartItem, Tag
+from users.models import Follow, User
+
+
+# ``setup`` and ``teardown`` run untimed around every request;
+# ``teardown`` gets the response, e.g. to delete what was created.
+Scenario = namedtuple(
+    'Scenario',
+    'name method path data auth setup teardown',
+    defaults=(None, True, None, None),
+)
+
+
+def route_names(patterns):
+    names = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names |= route_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+def api_route_names():
+    """Names of the routes under the ``api/`` prefix."""
+    for pattern in get_resolver().url_patterns:
+        if isinstance(pattern, URLResolver) and str(pattern.pattern) == 'api/':
+            return route_names(pattern.url_patterns)
+    return set()
+
+
+def sample_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (640, 480), '#49B64E').save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=settings.BASE_DIR, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs every API route through the test client against the current'
+        ' database and prints latency percentiles, throughput and SQL'
+        ' query counts per endpoint as JSON. Fill the database with'
+        ' generate_dataset first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--user', help='Username to benchmark as; defaults to the one'
+            ' with the fullest shopping cart.'
+        )
+        parser.add_argument(
+            '--password', default='password',
+            help='Password of the user, for the login route.'
+        )
+        parser.add_argument(
+            '--read-only', action='store_true', help='Skip writing routes.'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Clear the cache before every request.'
+        )
+        parser.add_argument('--only', help='Substring of scenario names.')
+        parser.add_argument('--output', help='File to write the JSON to.')
+
+    def get_user(self, username):
+        if username:
+            user = User.objects.filter(username=username).first()
+        else:
+            user = User.objects.order_by(
+                F('stats__cart_size').desc(nulls_last=True), 'pk'
+            ).first()
+        if user is None:
+            raise CommandError('No user to benchmark as.')
+        return user
+
+    def read_scenarios(self, user, password):
+        recipe = Recipe.objects.order_by('-favorites_count', 'pk').first()
+        ingredient = Ingredient.objects.order_by('pk').first()
+        tag = Tag.objects.order_by('pk').first()
+        if recipe is None or ingredient is None or tag is None:
+            raise CommandError('Generate a dataset first.')
+        author = recipe.author_id
+        return [
+            Scenario('api root', 'get', '/api/', auth=False),
+            Scenario('tags', 'get', '/api/tags/', auth=False),
+            Scenario('tag', 'get', f'/api/tags/{tag.pk}/', auth=False),
+            Scenario(
+                'ingredients search', 'get',
+                f'/api/ingredients/?name={ingredient.name[:3]}', auth=False
+            ),
+            Scenario(
+                'ingredient', 'get', f'/api/ingredients/{ingredient.pk}/',
+                auth=False
+            ),
+            Scenario('recipes anonymous', 'get', '/api/recipes/', auth=False),
+            Scenario('recipes', 'get', '/api/recipes/'),
+            Scenario(
+                'recipes cursor', 'get', '/api/recipes/?pagination=cursor'
+            ),
+            Scenario(
+                'recipes by tag', 'get', f'/api/recipes/?tags={tag.slug}'
+            ),
+            Scenario(
+                'recipes by author', 'get', f'/api/recipes/?author={author}'
+            ),
+            Scenario(
+                'recipes favourited', 'get', '/api/recipes/?is_favorited=1'
+            ),
+            Scenario(
+                'recipes in cart', 'get',
+                '/api/recipes/?is_in_shopping_cart=1'
+            ),
+            Scenario(
+                'recipes search', 'get',
+                f'/api/recipes/?search={ingredient.name[:5]}'
+            ),
+            Scenario('recipe anonymous', 'get', f'/api/recipes/{recipe.pk}/',
+                     auth=False),
+            Scenario('recipe', 'get', f'/api/recipes/{recipe.pk}/'),
+            *(
+                Scenario(
+                    f'shopping list {file_format}', 'get',
+                    '/api/recipes/download_shopping_cart/'
+                    f'?format={file_format}'
+                )
+                for file_format in ('txt', 'csv', 'json')
+            ),
+            Scenario('users', 'get', '/api/users/'),
+            Scenario('user', 'get', f'/api/users/{author}/'),
+            Scenario('me', 'get', '/api/users/me/'),
+            Scenario(
+                'subscriptions', 'get',
+                '/api/users/subscriptions/?recipes_limit=3'
+            ),
+            Scenario(
+                'login', 'post', '/api/auth/token/login/',
+                {'email': user.email, 'password': password}, auth=False
+            ),
+        ]
+
+    def write_scenarios(self, user):
+        outsiders = list(Recipe.objects.exclude(
+            shoppingcartitem__user=user
+        ).exclude(favouritesitem__user=user).order_by('pk').values_list(
+            'pk', flat=True
+        )[:8])
+        author = User.objects.exclude(pk=user.pk).exclude(
+            pk__in=Follow.objects.filter(user=user).values('author')
+        ).order_by('pk').first()
+        ingredients = list(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True)[:3]
+        )
+        tags = list(Tag.objects.order_by('pk').values_list('pk', flat=True))
+        payload = {
+            'name': 'Бенчмарк', 'text': 'Рецепт для замеров.',
+            'cooking_time': 10, 'image': sample_image(), 'tags': tags[:2],
+            'ingredients': [
+                {'id': pk, 'amount': 10 * number}
+                for number, pk in enumerate(ingredients, 1)
+            ],
+        }
+        own = self.request('post', '/api/recipes/', payload)
+        scenarios = [
+            Scenario(
+                'create recipe', 'post', '/api/recipes/', payload,
+                teardown=lambda response: self.request(
+                    'delete', f'/api/recipes/{response.json()["id"]}/'
+                ),
+            ),
+            Scenario('update recipe', 'patch', f'/api/recipes/{own}/', {
+                **payload, 'cooking_time': 20,
+            }),
+            Scenario(
+                'delete recipe', 'delete', '/api/recipes/{created}/',
+                setup=lambda: self.request('post', '/api/recipes/', payload),
+            ),
+        ]
+        if outsiders:
+            bulk = {'ids': outsiders}
+            for collection in ('favorite', 'shopping_cart'):
+                path = f'/api/recipes/{outsiders[0]}/{collection}/'
+                bulk_path = f'/api/recipes/{collection}/'
+                scenarios += [
+                    Scenario(
+                        f'add to {collection}', 'post', path,
+                        teardown=lambda _, path=path: self.request(
+                            'delete', path
+                        ),
+                    ),
+                    Scenario(
+                        f'remove from {collection}', 'delete', path,
+                        setup=lambda path=path: self.request('post', path),
+                    ),
+                    Scenario(
+                        f'bulk add to {collection}', 'post', bulk_path, bulk,
+                        teardown=lambda _, path=bulk_path: self.request(
+                            'delete', path, bulk
+                        ),
+                    ),
+                    Scenario(
+                        f'bulk remove from {collection}', 'delete',
+                        bulk_path, bulk,
+                        setup=lambda path=bulk_path: self.request(
+                            'post', path, bulk
+                        ),
+                    ),
+                ]
+        if author is not None:
+            path = f'/api/users/{author.pk}/subscribe/'
+            scenarios += [
+                Scenario(
+                    'subscribe', 'post', path,
+                    teardown=lambda _: self.request('delete', path),
+                ),
+                Scenario(
+                    'unsubscribe', 'delete', path,
+                    setup=lambda: self.request('post', path),
+                ),
+            ]
+        return own, scenarios
+
+    def request(self, method, path, data=None, auth=True):
+        """Untimed request; returns the id of a created object, if any."""
+        client = self.client if auth else self.anonymous
+        response = getattr(client, method)(
+            path, data, content_type='application/json'
+        )
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{method.upper()} {path}: {response.status_code}'
+                f' {response.content[:300]!r}'
+            )
+        if response.get('Content-Type', '').startswith('application/json'):
+            data = response.json()
+            return data.get('id') if isinstance(data, dict) else None
+        return None
+
+    def measure(self, scenario, iterations, warmup, cold):
+        client = self.client if scenario.auth else self.anonymous
+        latencies, queries, query_time, statuses = [], [], [], set()
+        for iteration in range(warmup + iterations):
+            path = scenario.path
+            if scenario.setup is not None:
+                path = path.format(created=scenario.setup())
+            if cold:
+                cache.clear()
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                response = getattr(client, scenario.method)(
+                    path, scenario.data, content_type='application/json'
+                )
+                if response.streaming:
+                    for _ in response.streaming_content:
+                        pass
+                elapsed = time.perf_counter() - started
+            if scenario.teardown is not None:
+                scenario.teardown(response)
+            if iteration < warmup:
+                continue
+            latencies.append(elapsed)
+            queries.append(counter.count)
+            query_time.append(counter.duration)
+            statuses.add(response.status_code)
+        percentiles = statistics.quantiles(
+            latencies, n=100, method='inclusive'
+        )
+        return {
+            'name': scenario.name,
+            'method': scenario.method.upper(),
+            'path': scenario.path,
+            # The path of the last request: templates such as
+            # '/api/recipes/{created}/' only resolve once formatted.
+            'route': resolve(urlsplit(path).path).url_name,
+            'status': sorted(statuses),
+            'p50_ms': round(percentiles[49] * 1000, 3),
+            'p95_ms': round(percentiles[94] * 1000, 3),
+            'p99_ms': round(percentiles[98] * 1000, 3),
+            'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+            'throughput_rps': round(len(latencies) / sum(latencies), 1),
+            'queries': max(queries),
+            'query_ms': round(statistics.mean(query_time) * 1000, 3),
+        }
+
+    def dataset(self):
+        return {
+            model._meta.label: model.objects.count()
+            for model in (
+                User, Follow, Tag, Ingredient, Recipe, ShoppingCartItem,
+            )
+        }
+
+    def handle(self, *args, iterations, warmup, user, password, read_only,
+               cold, only, output, **options):
+        if iterations < 2:
+            raise CommandError('Run at least 2 iterations.')
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']
+        ):
+            user = self.get_user(user)
+            token, _ = Token.objects.get_or_create(user=user)
+            self.client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+            self.anonymous = Client()
+            scenarios = self.read_scenarios(user, password)
+            own = None
+            if not read_only:
+                own, writes = self.write_scenarios(user)
+                scenarios += writes
+            if only:
+                scenarios = [
+                    scenario for scenario in scenarios
+                    if only in scenario.name
+                ]
+            results = []
+            try:
+                for scenario in scenarios:
+                    self.stderr.write(f'{scenario.name}...')
+                    results.append(
+                        self.measure(scenario, iterations, warmup, cold)
+                    )
+            finally:
+                if own is not None:
+                    self.request('delete', f'/api/recipes/{own}/')
+        report = {
+            'commit': current_commit(),
+            'database': connection.vendor,
+            'cache': settings.CACHES['default']['BACKEND'],
+            'iterations': iterations,
+            'user': user.username,
+            'dataset': self.dataset(),
+            'endpoints': results,
+            'uncovered_routes': sorted(
+                api_route_names() - {result['route'] for result in results}
+            ),
+        }
+        report = json.dumps(report, ensure_ascii=False, indent=2)
+        if output:
+            with open(output, 'w', encoding='utf-8') as file:
+                file.write(report)
+        else:
+            self.stdout.write(report)
@@ -1,6 +1,33 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class FoodgramPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class FoodgramCursorPagination(CursorPagination):
+    """Keyset pagination seeking by id: no ``COUNT(*)`` and no ``OFFSET``."""
+
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = '-id'
+
+
+class CursorPaginationMixin:
+    """Lets clients opt in to cursor pagination with ``?pagination=cursor``.
+
+    The ``next``/``previous`` links keep the parameter, so only the first
+    request has to set it.
+    """
+
+    cursor_pagination_class = FoodgramCursorPagination
+    cursor_pagination_param = 'pagination'
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator') and self.request.query_params.get(
+            self.cursor_pagination_param
+        ) == 'cursor':
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
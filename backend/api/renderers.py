@@ -0,0 +1,66 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Base for the shopping list formats, rendered item by item.
+
+    Items are dicts with ``name``, ``measurement_unit`` and ``total`` keys.
+    """
+
+    charset = 'utf-8'
+    fields = ('name', 'measurement_unit', 'total')
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            # Error payloads (authentication, unknown format) aren't lists.
+            return json.dumps(data, ensure_ascii=False).encode(self.charset)
+        return ''.join(self.stream(data)).encode(self.charset)
+
+    def stream(self, items):
+        raise NotImplementedError
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, items):
+        for item in items:
+            yield (
+                f'{item["name"]} — {item["total"]}'
+                f' {item["measurement_unit"]}.\r\n'
+            )
+
+
+class Echo:
+    """File-like object handing written rows back to the csv writer."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, items):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.fields)
+        for item in items:
+            yield writer.writerow([item[field] for field in self.fields])
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, items):
+        separator = '['
+        for item in items:
+            item = {field: item[field] for field in self.fields}
+            yield separator + json.dumps(item, ensure_ascii=False)
+            separator = ','
+        yield '[]' if separator == '[' else ']'
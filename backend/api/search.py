@@ -0,0 +1,107 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from recipes.models import Ingredient
+from .cache import get_versions
+
+
+def fold(text):
+    """Case-folds the text and treats 'ё' as 'е' for matching."""
+    return text.casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """In-memory ingredient search mirroring ``IngredientSearchFilter``.
+
+    Names are kept sorted for prefix lookups, and every 1-3 character
+    n-gram maps to the positions of the names containing it, so substring
+    matches only look at candidates sharing the query's rarest n-gram.
+    The index is built on first use. Ingredient writes drop it in the
+    process making them; other processes learn of them from the ingredient
+    cache version, which lives in the shared cache and is read at most once
+    per ``INGREDIENT_SEARCH_RECHECK`` seconds, so lookups in between touch
+    neither the cache nor the database.
+    """
+
+    max_gram = 3
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+        self._checked = None
+
+    def invalidate(self):
+        self._state = None
+
+    def _build(self):
+        entries = sorted(
+            (fold(name), name, pk, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'pk', 'name', 'measurement_unit'
+            )
+        )
+        grams = {}
+        for position, (key, *_) in enumerate(entries):
+            for size in range(1, self.max_gram + 1):
+                for start in range(len(key) - size + 1):
+                    grams.setdefault(key[start:start + size], set()).add(
+                        position
+                    )
+        return [entry[0] for entry in entries], entries, grams
+
+    def _get_state(self):
+        """Rebuilds the index if it was dropped or the version has changed.
+
+        The version is read before building, so a change committed in the
+        meantime is picked up by the next check.
+        """
+        state = self._state
+        checked = self._checked
+        if state is not None and checked is not None and (
+            time.monotonic() - checked < settings.INGREDIENT_SEARCH_RECHECK
+        ):
+            return state[1:]
+        with self._lock:
+            now = time.monotonic()
+            version, = get_versions(Ingredient._meta.label_lower)
+            if self._state is None or self._state[0] != version:
+                self._state = (version, *self._build())
+            self._checked = now
+            return self._state[1:]
+
+    def search(self, value, limit=None):
+        """Returns serialized ingredients starting with or containing value.
+
+        Names starting with the value come first, both groups sorted by name.
+        """
+        keys, entries, grams = self._get_state()
+        query = fold(value)
+        found = []
+        position = bisect_left(keys, query)
+        while position < len(keys) and keys[position].startswith(query):
+            found.append(position)
+            position += 1
+        if limit is None or len(found) < limit:
+            size = min(len(query), self.max_gram)
+            postings = [
+                grams.get(query[start:start + size], set())
+                for start in range(len(query) - size + 1)
+            ]
+            candidates = min(postings, key=len) if postings else ()
+            prefixed = set(found)
+            found.extend(
+                position for position in sorted(candidates)
+                if position not in prefixed and query in keys[position]
+            )
+        return [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, name, pk, measurement_unit in (
+                entries[position] for position in found[:limit]
+            )
+        ]
+
+
+ingredient_index = IngredientIndex()
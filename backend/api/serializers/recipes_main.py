@@ -1,6 +1,10 @@
-from drf_extra_fields.fields import Base64ImageField
+import json
+
 from rest_framework import serializers
-from django.db import models
+from rest_framework.utils import html
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
 from django.forms import ValidationError
 
 from recipes.models import (
@@ -8,10 +12,34 @@ from recipes.models import (
     Ingredient,
     Recipe,
     RecipeIngredient,
-    ShoppingCart,
+    ShoppingCartItem,
     Tag,
 )
+from recipes.tasks import rebuild_shopping_lists
+from ..cache import versions_digest
+from ..tasks import prepare_recipe
+from .recipes_misc import HashedBase64ImageField, ImageVariantsMixin
 from .users_main import FoodgramUserSerializer
+from users.models import User
+
+
+class RelativeURLRequest:
+    """Request in the context of shared fragments: media URLs stay relative.
+
+    The site answers to whatever Host clients send, so fragments shared by
+    all requests must not hold it; ``represent`` makes the URLs absolute
+    for each request.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    def __getattr__(self, name):
+        return getattr(self.request, name)
+
+    @staticmethod
+    def build_absolute_uri(location):
+        return location
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -44,34 +72,80 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'measurement_unit', 'amount']
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        return self.child.represent(list(iterable))
+
+
+class RecipeSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     author = FoodgramUserSerializer(
         default=serializers.CurrentUserDefault()
     )
     ingredients = RecipeIngredientSerializer(
         many=True, source='recipeingredient_set'
     )
-    image = Base64ImageField()
+    image = HashedBase64ImageField()
+    image_variants = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     cooking_time = serializers.IntegerField(min_value=1)
 
+    user_fields = ('is_favorited', 'is_in_shopping_cart')
+
     class Meta:
         model = Recipe
-        fields = '__all__'
+        exclude = ('updated_at', 'favorites_count')
+        list_serializer_class = RecipeListSerializer
 
     def get_user(self):
         return self.context['request'].user
 
     @staticmethod
     def add_ingredients(recipe, ingredients):
-        for ingredient in ingredients:
-            RecipeIngredient.objects.create(
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
                 recipe=recipe,
                 ingredient=ingredient['ingredient']['id'],
                 amount=ingredient['amount']
             )
+            for ingredient in ingredients
+        )
+
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        """ Writes only the difference against the stored ingredients.
+
+        Returns the amount change per ingredient.
+        """
+        amounts = {
+            ingredient['ingredient']['id'].pk: ingredient['amount']
+            for ingredient in ingredients
+        }
+        deltas = amounts.copy()
+        changed, removed = [], []
+        for row in RecipeIngredient.objects.filter(recipe=recipe):
+            deltas[row.ingredient_id] = (
+                deltas.get(row.ingredient_id, 0) - row.amount
+            )
+            amount = amounts.pop(row.ingredient_id, None)
+            if amount is None:
+                removed.append(row.pk)
+            elif amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        RecipeIngredient.objects.filter(pk__in=removed).delete()
+        RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+        )
+        return deltas
 
+    @transaction.atomic
     def create(self, validated_data):
         """ Custom create method to handle nested tags and ingredients. """
         ingredients = validated_data.pop('recipeingredient_set')
@@ -79,16 +153,42 @@ class RecipeSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         self.add_ingredients(recipe, ingredients)
+        self.prepare(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
         """ Custom update method by overwriting tags and ingredients. """
         ingredients = validated_data.pop('recipeingredient_set')
         tags = validated_data.pop('tags')
         recipe.tags.set(tags)
-        recipe.recipeingredient_set.all().delete()
-        self.add_ingredients(recipe, ingredients)
-        return super().update(recipe, validated_data)
+        deltas = self.update_ingredients(recipe, ingredients)
+        if any(deltas.values()):
+            rebuild_shopping_lists.delay(recipe.pk)
+        recipe = super().update(recipe, validated_data)
+        self.prepare(recipe)
+        return recipe
+
+    def prepare(self, recipe):
+        """Queues the image variants and the warming of the cached fragment.
+        """
+        prepare_recipe.delay(recipe.pk)
+
+    def to_internal_value(self, data):
+        """ Multipart forms send ingredients as a JSON string. """
+        if html.is_html_input(data) and 'ingredients' in data:
+            try:
+                ingredients = json.loads(data['ingredients'])
+            except ValueError:
+                raise serializers.ValidationError(
+                    {'ingredients': ['Ожидается список ингредиентов в JSON.']}
+                )
+            data = {
+                **data.dict(),
+                'tags': data.getlist('tags'),
+                'ingredients': ingredients,
+            }
+        return super().to_internal_value(data)
 
     def validate(self, attrs):
         if len(attrs['recipeingredient_set']) == 0:
@@ -109,29 +209,83 @@ class RecipeSerializer(serializers.ModelSerializer):
         return attrs
 
     def to_representation(self, data):
-        """ Serializing tags manually. """
         iterable = data.all() if isinstance(data, models.Manager) else data
-        tags = TagSerializer(iterable.tags.all(), many=True).data
-        rep = super().to_representation(iterable)
+        return self.represent([iterable])[0]
+
+    def shared_representation(self, recipe):
+        """ Serializing tags manually. """
+        tags = TagSerializer(recipe.tags.all(), many=True).data
+        rep = super().to_representation(recipe)
         rep['tags'] = tags
         return rep
 
+    def represent(self, recipes):
+        """ Serializes recipes, reusing cached user-independent parts.
+
+        Fragments are keyed by the recipe's ``updated_at``, read together
+        with the recipe itself, and by the versions of the shared models it
+        embeds; only the per-user flags and the absolute media URLs are
+        computed on every call.
+        """
+        suffix = versions_digest(Tag, Ingredient, User)
+        keys = [
+            f'recipe-fragment:{recipe.pk}:{recipe.updated_at.timestamp()}'
+            f':{suffix}'
+            for recipe in recipes
+        ]
+        fragments = cache.get_many(keys)
+        missing = {}
+        representations = []
+        request = self.context['request']
+        shared = None
+        for key, recipe in zip(keys, recipes):
+            if key not in fragments:
+                if shared is None:
+                    shared = type(self)(context={
+                        **self.context,
+                        'request': RelativeURLRequest(request),
+                    })
+                fragments[key] = missing[key] = (
+                    shared.shared_representation(recipe)
+                )
+            rep = self.absolute_urls(fragments[key], request)
+            rep['author'] = dict(
+                rep['author'],
+                is_subscribed=self.fields['author'].get_is_subscribed(
+                    recipe.author
+                ),
+            )
+            for field in self.user_fields:
+                rep[field] = self.fields[field].to_representation(recipe)
+            representations.append(rep)
+        cache.set_many(missing, settings.RESPONSE_CACHE_TIMEOUT)
+        return representations
+
+    @staticmethod
+    def absolute_urls(fragment, request):
+        """Copy of the fragment with the media URLs made absolute."""
+        def absolute(url):
+            return request.build_absolute_uri(url) if url else url
+
+        rep = dict(fragment, image=absolute(fragment['image']))
+        rep['image_variants'] = {
+            variant: {key: absolute(url) for key, url in urls.items()}
+            for variant, urls in fragment['image_variants'].items()
+        }
+        return rep
+
     def get_is_favorited(self, recipe):
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         user = self.get_user()
-        if user.is_authenticated:
-            try:
-                favourites = user.favouritesitem.recipes.all()
-                return recipe in favourites
-            except FavouritesItem.DoesNotExist:
-                return False
-        return False
+        return user.is_authenticated and FavouritesItem.objects.filter(
+            user=user, recipe=recipe
+        ).exists()
 
     def get_is_in_shopping_cart(self, recipe):
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         user = self.get_user()
-        if user.is_authenticated:
-            try:
-                shopping_cart = user.shoppingcart.recipes.all()
-                return recipe in shopping_cart
-            except ShoppingCart.DoesNotExist:
-                return False
-        return False
+        return user.is_authenticated and ShoppingCartItem.objects.filter(
+            user=user, recipe=recipe
+        ).exists()
@@ -1,9 +1,63 @@
-from rest_framework.serializers import ModelSerializer
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework.serializers import (
+    ImageField,
+    IntegerField,
+    ListField,
+    ModelSerializer,
+    Serializer,
+    SerializerMethodField,
+    ValidationError,
+)
+from django.core.files.uploadedfile import UploadedFile
 
+from recipes.images import content_hash, file_content_hash, variant_urls
 from recipes.models import Recipe
 
 
-class RecipeLiteSerializer(ModelSerializer):
+class HashedBase64ImageField(Base64ImageField):
+    """Names uploads by content hash, so identical images are stored once.
+
+    Takes a base64 string or a multipart file part.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, UploadedFile):
+            return super().to_internal_value(data)
+        image = ImageField.to_internal_value(self, data)
+        extension = image.image.format.lower()
+        extension = 'jpg' if extension == 'jpeg' else extension
+        if extension not in self.ALLOWED_TYPES:
+            raise ValidationError(self.INVALID_TYPE_MESSAGE)
+        image.name = f'{file_content_hash(image)}.{extension}'
+        return image
+
+    def get_file_name(self, decoded_file):
+        return content_hash(decoded_file)
+
+
+class ImageVariantsMixin:
+
+    def get_image_variants(self, recipe):
+        request = self.context.get('request')
+        return variant_urls(
+            recipe, request.build_absolute_uri if request else None
+        )
+
+
+class RecipeLiteSerializer(ImageVariantsMixin, ModelSerializer):
+    image_variants = SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ['id', 'name', 'image', 'cooking_time']
+        fields = ['id', 'name', 'image', 'image_variants', 'cooking_time']
+
+
+class RecipeIdsSerializer(Serializer):
+    """Recipe ids for the bulk collection actions, without duplicates."""
+
+    ids = ListField(
+        child=IntegerField(min_value=1), allow_empty=False, max_length=100
+    )
+
+    def validate_ids(self, ids):
+        return list(dict.fromkeys(ids))
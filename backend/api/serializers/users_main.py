@@ -1,13 +1,15 @@
 from djoser.serializers import UserCreateSerializer
 from rest_framework.serializers import (
     EmailField,
+    ListSerializer,
     ModelSerializer,
     SerializerMethodField,
 )
 from rest_framework.validators import UniqueValidator
+from django.db.models import Manager
 
 from .recipes_misc import Recipe, RecipeLiteSerializer
-from users.models import Follow, User
+from users.models import Follow, User, UserStats
 
 
 class FoodgramUserCreateSerializer(UserCreateSerializer):
@@ -44,6 +46,8 @@ class FoodgramUserSerializer(ModelSerializer):
         )
 
     def get_is_subscribed(self, author):
+        if hasattr(author, 'is_subscribed'):
+            return author.is_subscribed
         result = False
         request = self.context.get("request")
         if request and hasattr(request, "user"):
@@ -54,6 +58,25 @@ class FoodgramUserSerializer(ModelSerializer):
         return result  # noqa
 
 
+class SubscriptionListSerializer(ListSerializer):
+    """Loads the recipes of all the authors on the page in one query."""
+
+    def to_representation(self, data):
+        authors = list(data.all() if isinstance(data, Manager) else data)
+        recipes = Recipe.objects.filter(author__in=authors).only(
+            *RecipeLiteSerializer.Meta.fields, 'author'
+        )
+        limit = self.child.get_recipes_limit()
+        if limit is not None:
+            recipes = recipes.latest_per_author(limit)
+        by_author = {author.pk: [] for author in authors}
+        for recipe in recipes:
+            by_author[recipe.author_id].append(recipe)
+        for author in authors:
+            author.latest_recipes = by_author[author.pk]
+        return super().to_representation(authors)
+
+
 class SubscriptionUserSerializer(FoodgramUserSerializer):
     recipes = SerializerMethodField()
     recipes_count = SerializerMethodField()
@@ -64,14 +87,25 @@ class SubscriptionUserSerializer(FoodgramUserSerializer):
             'email', 'id', 'username', 'first_name', 'last_name',
             'is_subscribed', 'recipes', 'recipes_count'
         )
+        list_serializer_class = SubscriptionListSerializer
+
+    def get_recipes_limit(self):
+        request = self.context.get('request')
+        if request and 'recipes_limit' in request.query_params:
+            return int(request.query_params['recipes_limit'])
+        return None
 
     def get_recipes_count(self, user):
-        return user.recipes.count()
+        try:
+            return user.stats.recipes_count
+        except UserStats.DoesNotExist:
+            return user.recipes.count()
 
     def get_recipes(self, user):
-        queryset = Recipe.objects.filter(author=user)
-        limit = queryset.count()
-        request = self.context.get('request')
-        if request:
-            limit = int(request.query_params.get('recipes_limit', limit))
-        return RecipeLiteSerializer(queryset[:limit], many=True).data
+        if hasattr(user, 'latest_recipes'):
+            recipes = user.latest_recipes
+        else:
+            recipes = Recipe.objects.filter(author=user)[
+                :self.get_recipes_limit()
+            ]
+        return RecipeLiteSerializer(recipes, many=True).data
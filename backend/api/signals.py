@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    Tag,
+    collection_changed,
+)
+from recipes.signals import bulk_changed
+from .cache import bump_versions, user_version_name
+from .search import ingredient_index
+from users.models import Follow, User
+
+
+VERSIONED_MODELS = (Tag, Ingredient, Recipe, RecipeIngredient, User)
+
+
+def bump_versions_on_commit(*names):
+    """Readers must not see a new version before the new data."""
+    transaction.on_commit(lambda: bump_versions(*names))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(bulk_changed, sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    """Other processes catch up through the ingredient version."""
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver([post_save, post_delete, bulk_changed])
+def bump_model_version(sender, update_fields=None, **kwargs):
+    if sender not in VERSIONED_MODELS:
+        return
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    bump_versions_on_commit(sender._meta.label_lower)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipe_version(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_versions_on_commit(Recipe._meta.label_lower)
+
+
+@receiver(collection_changed)
+def bump_collection_version(sender, user_id, **kwargs):
+    bump_versions_on_commit(user_version_name(user_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_follower_version(sender, instance, **kwargs):
+    bump_versions_on_commit(user_version_name(instance.user_id))
@@ -0,0 +1,34 @@
+from django.contrib.auth.models import AnonymousUser
+
+from recipes.models import Recipe
+from recipes.tasks import generate_image_variants
+from tasks.queue import task
+
+
+class TaskRequest:
+    """Stands for a request in the serializer context of background tasks.
+    """
+
+    user = AnonymousUser()
+
+    @staticmethod
+    def build_absolute_uri(location):
+        return location
+
+
+@task
+def prepare_recipe(recipe_id):
+    """Generates the image variants, then caches the recipe fragment.
+
+    Saving the variants changes ``updated_at`` and so the fragment key,
+    hence one task doing both in this order.
+    """
+    from .serializers.recipes_main import RecipeSerializer
+
+    generate_image_variants(recipe_id)
+    request = TaskRequest()
+    recipes = (
+        Recipe.objects.filter(pk=recipe_id)
+        .with_related(request.user).with_user_flags(request.user)
+    )
+    RecipeSerializer(context={'request': request}).represent(list(recipes))
@@ -0,0 +1,1114 @@
+import asyncio
+import base64
+import importlib
+import io
+import json
+import tempfile
+import time
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase, APITransactionTestCase
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve
+from django.utils.http import http_date
+
+from api import urls as api_urls
+from config import urls as config_urls
+
+from recipes.images import (
+    VARIANTS,
+    ContentAddressedStorage,
+    content_hash,
+    variant_name,
+)
+from recipes.search import get_search_backend
+from recipes.models import (
+    FavouritesItem,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCartItem,
+    Tag,
+)
+from tasks.models import Task
+from tasks.queue import claim, run
+from .cache import bump_versions
+from .search import ingredient_index
+from .serializers.recipes_main import RecipeSerializer
+from users.models import Follow, User, UserStats
+
+
+class ShoppingListDownloadTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            'reader', 'reader@example.com', 'password'
+        )
+        cls.token = Token.objects.create(user=cls.user)
+        recipe = Recipe.objects.create(
+            author=cls.user, name='Суп', text='Варить.', cooking_time=10,
+            image='recipes/test.jpg'
+        )
+        for name, amount in (('морковь', 10), ('лук', 20)):
+            RecipeIngredient.objects.create(
+                recipe=recipe, amount=amount,
+                ingredient=Ingredient.objects.create(
+                    name=name, measurement_unit='г'
+                ),
+            )
+        ShoppingCartItem.objects.add(cls.user, [recipe.pk])
+
+    async def test_download_under_asgi(self):
+        """The body is iterated in the event loop, without ORM calls."""
+        response = await self.async_client.get(
+            '/api/recipes/download_shopping_cart/?format=csv',
+            AUTHORIZATION=f'Token {self.token.key}',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            b''.join(response.streaming_content).decode(),
+            'name,measurement_unit,total\r\n'
+            'лук,г,20\r\nморковь,г,10\r\n',
+        )
+
+
+class AsyncReadTests(APITestCase):
+    """Routes of ``ASYNC_READS``, as served under ASGI."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            'reader', 'reader@example.com', 'password'
+        )
+        cls.token = Token.objects.create(user=cls.user)
+        Tag.objects.create(name='Обед', color='#49B64E', slug='lunch')
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='Суп', text='Варить.', cooking_time=10,
+            image='recipes/test.jpg'
+        )
+        FavouritesItem.objects.add(cls.user, [cls.recipe.pk])
+
+    def setUp(self):
+        cache.clear()
+        settings = override_settings(ASYNC_READS=True)
+        settings.enable()
+        self.addCleanup(self.reload_urls)
+        self.addCleanup(settings.disable)
+        self.reload_urls()
+
+    @staticmethod
+    def reload_urls():
+        """The async routes are added when ``api.urls`` is imported."""
+        importlib.reload(api_urls)
+        importlib.reload(config_urls)
+        clear_url_caches()
+
+    def get(self, path, token=None, **headers):
+        if token is not None:
+            headers['AUTHORIZATION'] = f'Token {token}'
+        return self.async_client.get(path, **headers)
+
+    @staticmethod
+    async def capture_queries(request):
+        """Sync views, the ORM included, run in the main thread."""
+        context = CaptureQueriesContext(connection)
+        await sync_to_async(context.__enter__)()
+        try:
+            response = await request
+        finally:
+            await sync_to_async(context.__exit__)(None, None, None)
+        return response, await sync_to_async(
+            lambda: context.captured_queries
+        )()
+
+    def test_routes(self):
+        self.assertTrue(
+            asyncio.iscoroutinefunction(resolve('/api/tags/').func)
+        )
+        self.assertTrue(asyncio.iscoroutinefunction(
+            resolve(f'/api/recipes/{self.recipe.pk}/').func
+        ))
+        self.assertEqual(
+            resolve('/api/recipes/download_shopping_cart/').url_name,
+            'recipe-download-shopping-cart',
+        )
+
+    async def test_revalidation_without_queries(self):
+        response, queries = await self.capture_queries(
+            self.get('/api/tags/')
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(queries)
+        response, queries = await self.capture_queries(
+            self.get('/api/tags/', IF_NONE_MATCH=response['ETag'])
+        )
+        self.assertEqual((response.status_code, queries), (304, []))
+
+    async def test_token_looked_up_once(self):
+        """The regular view reuses the token checked by the async one."""
+        response, queries = await self.capture_queries(
+            self.get(f'/api/recipes/{self.recipe.pk}/', self.token.key)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len([
+                query for query in queries
+                if 'authtoken_token' in query['sql']
+            ]),
+            1,
+        )
+
+    async def test_responses_are_cached_per_origin(self):
+        """The async client can't replace Host, so the scheme differs."""
+        await sync_to_async(Recipe.objects.create)(
+            author=self.user, name='Каша', text='Варить.', cooking_time=10,
+            image='recipes/test.jpg'
+        )
+        path = '/api/recipes/?limit=1'
+        secure = await self.async_client.get(path, secure=True)
+        self.assertTrue(
+            secure.json()['next'].startswith('https://testserver/')
+        )
+        for _ in range(2):
+            response = await self.get(path)
+            self.assertTrue(
+                response.json()['next'].startswith('http://testserver/')
+            )
+
+    async def test_authenticated_reads(self):
+        path = f'/api/recipes/{self.recipe.pk}/'
+        response = await self.get(path, self.token.key)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['is_favorited'])
+        self.assertFalse((await self.get(path)).json()['is_favorited'])
+        response = await self.get(
+            path, self.token.key, IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+        response = await self.get(path, 'invalid')
+        self.assertEqual(response.status_code, 401)
+        response = await self.get(
+            '/api/recipes/download_shopping_cart/', self.token.key
+        )
+        self.assertEqual(response.status_code, 200)
+
+    async def test_writes_run_the_regular_view(self):
+        response = await self.async_client.delete(
+            f'/api/recipes/{self.recipe.pk}/',
+            AUTHORIZATION=f'Token {self.token.key}',
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(
+            await sync_to_async(Recipe.objects.exists)()
+        )
+
+
+class ShoppingListTests(APITestCase):
+    """The shopping list aggregate follows the cart and its recipes."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            'reader', 'reader@example.com', 'password'
+        )
+        self.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'морковь {number}', measurement_unit='г')
+            for number in range(8)
+        )
+        self.small, self.large = (
+            self.add_recipe(self.ingredients[:count]) for count in (2, 8)
+        )
+        self.client.force_authenticate(self.user)
+
+    def add_recipe(self, ingredients):
+        recipe = Recipe.objects.create(
+            author=self.user, name='Суп', text='Варить.', cooking_time=10,
+            image='recipes/test.jpg'
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+            for ingredient in ingredients
+        )
+        return recipe
+
+    def assertShoppingList(self, totals):
+        self.assertEqual(
+            dict(self.user.shopping_list.values_list('ingredient', 'total')),
+            {
+                ingredient.pk: total
+                for ingredient, total in zip(self.ingredients, totals)
+                if total
+            },
+        )
+
+    def test_cart_changes(self):
+        for recipe in (self.small, self.large):
+            self.client.post(f'/api/recipes/{recipe.pk}/shopping_cart/')
+        self.assertShoppingList([20, 20, 10, 10, 10, 10, 10, 10])
+        self.client.delete(f'/api/recipes/{self.large.pk}/shopping_cart/')
+        self.assertShoppingList([10, 10])
+        self.small.delete()
+        self.assertShoppingList([])
+
+    @override_settings(TASKS_EAGER=False)
+    def test_recipe_changes(self):
+        """Carts are rebuilt by a task, which may run late or twice."""
+        other = User.objects.create_user(
+            'other', 'other@example.com', 'password'
+        )
+        self.client.post(f'/api/recipes/{self.small.pk}/shopping_cart/')
+        tag = Tag.objects.create(name='Обед', color='#49B64E', slug='lunch')
+        response = self.client.patch(
+            f'/api/recipes/{self.small.pk}/',
+            {
+                'cooking_time': 10,
+                'tags': [tag.pk],
+                'ingredients': [
+                    {'id': self.ingredients[0].pk, 'amount': 20},
+                    {'id': self.ingredients[2].pk, 'amount': 5},
+                ],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        # Only the list rebuild is under test, not the image processing.
+        Task.objects.exclude(name__endswith='rebuild_shopping_lists').delete()
+        ShoppingCartItem.objects.add(other, [self.small.pk])
+        for _ in range(2):
+            Task.objects.update(status=Task.PENDING)
+            for task_row in claim(10):
+                run(task_row)
+        self.assertShoppingList([20, 0, 5])
+        self.assertEqual(
+            dict(other.shopping_list.values_list('ingredient', 'total')),
+            {self.ingredients[0].pk: 20, self.ingredients[2].pk: 5},
+        )
+
+    def test_cart_change_queries(self):
+        """Adding a recipe costs the same whatever its ingredient count."""
+        counts = []
+        for recipe in (self.small, self.large):
+            with CaptureQueriesContext(connection) as context:
+                self.client.post(f'/api/recipes/{recipe.pk}/shopping_cart/')
+            counts.append(len(context))
+        self.assertEqual(counts[0], counts[1])
+        self.assertLessEqual(counts[0], 11)
+
+
+class ConditionalGetTests(APITestCase):
+    """Validators change with the data and answer repeats with 304."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            'reader', 'reader@example.com', 'password'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='Суп', text='Варить.', cooking_time=10,
+            image='recipes/test.jpg'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidate(self, path, etag):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        return response.status_code, len(context)
+
+    def test_not_modified(self):
+        for path in ('/api/tags/', '/api/recipes/', '/api/recipes/?limit=1'):
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertNotIn('Last-Modified', response)
+                self.assertEqual(
+                    self.revalidate(path, response['ETag']), (304, 0)
+                )
+
+    def test_responses_are_cached_per_host(self):
+        """Links built from a forged Host don't reach other clients."""
+        Recipe.objects.create(
+            author=self.user, name='Каша', text='Варить.', cooking_time=10,
+            image='recipes/test.jpg'
+        )
+        path = '/api/recipes/?limit=1'
+        forged = self.client.get(path, HTTP_HOST='evil.example')
+        self.assertTrue(forged.data['next'].startswith('http://evil.example/'))
+        response = self.client.get(path)
+        self.assertNotEqual(response['ETag'], forged['ETag'])
+        self.assertTrue(response.data['next'].startswith('http://testserver/'))
+        self.assertEqual(
+            self.revalidate(path, forged['ETag'])[0], 200
+        )
+
+    def test_if_modified_since_is_not_trusted(self):
+        """Writes within a second must not be answered with 304."""
+        self.client.get('/api/tags/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Обед', color='#49B64E', slug='lunch')
+        response = self.client.get(
+            '/api/tags/', HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+    def test_changes_bump_validators(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Обед', color='#49B64E', slug='lunch')
+        self.assertEqual(self.revalidate('/api/tags/', etag)[0], 200)
+
+    def test_user_dependent_validators(self):
+        path = f'/api/recipes/{self.recipe.pk}/'
+        anonymous = self.client.get(path)['ETag']
+        self.client.force_authenticate(self.user)
+        response = self.client.get(path)
+        self.assertNotEqual(response['ETag'], anonymous)
+        self.assertIn('Authorization', response['Vary'])
+        self.assertEqual(self.revalidate(path, response['ETag'])[0], 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'{path}shopping_cart/')
+        self.assertEqual(self.revalidate(path, response['ETag'])[0], 200)
+
+
+@override_settings(INGREDIENT_SEARCH_RECHECK=0)
+class IngredientIndexTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        ingredient_index.invalidate()
+        Ingredient.objects.create(name='морковь', measurement_unit='г')
+
+    def search(self, value):
+        return [item['name'] for item in ingredient_index.search(value)]
+
+    def test_rebuilt_on_version_change(self):
+        """Writes of other processes only reach this one as a version."""
+        self.assertEqual(self.search('мор'), ['морковь'])
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='морошка', measurement_unit='г')]
+        )
+        self.assertEqual(self.search('мор'), ['морковь'])
+        bump_versions(Ingredient._meta.label_lower)
+        self.assertEqual(self.search('мор'), ['морковь', 'морошка'])
+
+    def test_import_reaches_index(self):
+        self.search('мор')
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as file:
+            file.write('name,measurement_unit\nморошка,г\n')
+            file.flush()
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command(
+                    'import_ingredients', file.name, stdout=io.StringIO()
+                )
+        self.assertEqual(self.search('мор'), ['морковь', 'морошка'])
+
+    @override_settings(INGREDIENT_SEARCH_RECHECK=60)
+    def test_version_checked_once_per_interval(self):
+        self.search('мор')
+        with mock.patch('api.search.get_versions') as get_versions:
+            with self.assertNumQueries(0):
+                self.assertEqual(self.search('морк'), ['морковь'])
+        get_versions.assert_not_called()
+
+    @override_settings(INGREDIENT_SEARCH_RECHECK=60)
+    def test_local_writes_invalidate(self):
+        self.search('мор')
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='морошка', measurement_unit='г')
+        self.assertEqual(self.search('мор'), ['морковь', 'морошка'])
+
+
+class SearchTests:
+    """Search through the API with the backend set in ``backend``.
+
+    Indexing runs on commit, so writes go through
+    ``captureOnCommitCallbacks``.
+    """
+
+    backend = None
+
+    def setUp(self):
+        settings = override_settings(SEARCH_BACKEND=self.backend)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        get_search_backend.cache_clear()
+        self.addCleanup(get_search_backend.cache_clear)
+        self.author = User.objects.create_user(
+            'author', 'author@example.com', 'password'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.carrot, self.cloudberry, self.beet = (
+                Ingredient.objects.create(name=name, measurement_unit='г')
+                for name in ('морковь', 'морошка', 'свёкла')
+            )
+            self.soup, self.pie = (
+                Recipe.objects.create(
+                    author=self.author, name=name, text=text,
+                    cooking_time=10, image='recipes/test.jpg',
+                )
+                for name, text in (
+                    ('Борщ', 'Варить долго.'),
+                    ('Пирог', 'Печь в духовке.'),
+                )
+            )
+            RecipeIngredient.objects.create(
+                recipe=self.soup, ingredient=self.beet, amount=1
+            )
+            RecipeIngredient.objects.create(
+                recipe=self.pie, ingredient=self.cloudberry, amount=1
+            )
+
+    def search_ingredients(self, value):
+        response = self.client.get('/api/ingredients/', {'name': value})
+        return [item['name'] for item in response.data]
+
+    def search_recipes(self, value):
+        response = self.client.get('/api/recipes/', {'search': value})
+        return {item['id'] for item in response.data['results']}
+
+    def test_ingredients(self):
+        for value, names in (
+            ('мор', ['морковь', 'морошка']),
+            ('рошк', ['морошка']),
+            ('МОРК', ['морковь']),
+            ('картофель', []),
+        ):
+            with self.subTest(value=value):
+                self.assertEqual(self.search_ingredients(value), names)
+
+    def test_recipes(self):
+        for value, recipes in (
+            ('борщ', {self.soup.pk}),
+            ('духовке', {self.pie.pk}),
+            ('морошка', {self.pie.pk}),
+            ('картофель', set()),
+        ):
+            with self.subTest(value=value):
+                self.assertEqual(self.search_recipes(value), recipes)
+
+    def test_index_follows_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.beet.name = 'картофель'
+            self.beet.save()
+            self.pie.delete()
+        self.assertEqual(self.search_recipes('картофель'), {self.soup.pk})
+        self.assertEqual(self.search_recipes('свёкла'), set())
+        self.assertEqual(self.search_recipes('пирог'), set())
+
+    def test_reindex(self):
+        with connection.cursor() as cursor:
+            cursor.execute(self.clear_index)
+        self.assertEqual(self.search_recipes('борщ'), set())
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reindex_search', stdout=io.StringIO())
+        self.assertEqual(self.search_recipes('борщ'), {self.soup.pk})
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite FTS5 search')
+class SQLiteSearchTests(SearchTests, APITestCase):
+
+    backend = 'recipes.search.SQLiteSearchBackend'
+    clear_index = 'DELETE FROM recipes_recipe_fts'
+
+
+@skipUnless(connection.vendor == 'postgresql', 'PostgreSQL full-text search')
+class PostgreSQLSearchTests(SearchTests, APITestCase):
+
+    backend = 'recipes.search.PostgreSQLSearchBackend'
+    clear_index = 'DELETE FROM recipes_recipe_search'
+
+
+class RecipeFragmentTests(APITestCase):
+    """Cached recipe fragments are shared by users and follow changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader = (
+            User.objects.create_user(name, f'{name}@example.com', 'password')
+            for name in ('author', 'reader')
+        )
+        cls.tag = Tag.objects.create(
+            name='Обед', color='#49B64E', slug='lunch'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Суп', text='Варить.', cooking_time=10,
+            image='recipes/test.jpg'
+        )
+        cls.recipe.tags.set([cls.tag])
+        cls.path = f'/api/recipes/{cls.recipe.pk}/'
+
+    def setUp(self):
+        cache.clear()
+        shared_representation = mock.patch.object(
+            RecipeSerializer, 'shared_representation', autospec=True,
+            side_effect=RecipeSerializer.shared_representation,
+        )
+        self.shared_representation = shared_representation.start()
+        self.addCleanup(shared_representation.stop)
+
+    def get(self, user):
+        self.client.force_authenticate(user)
+        return self.client.get(self.path).data
+
+    def test_fragment_shared_between_users(self):
+        FavouritesItem.objects.add(self.reader, [self.recipe.pk])
+        self.assertTrue(self.get(self.reader)['is_favorited'])
+        self.assertFalse(self.get(self.author)['is_favorited'])
+        self.assertEqual(self.shared_representation.call_count, 1)
+
+    def test_fragment_follows_embedded_changes(self):
+        self.get(self.reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tag.name = 'Ужин'
+            self.tag.save()
+            self.author.first_name = 'Автор'
+            self.author.save()
+        data = self.get(self.reader)
+        self.assertEqual(data['tags'][0]['name'], 'Ужин')
+        self.assertEqual(data['author']['first_name'], 'Автор')
+        self.recipe.name = 'Борщ'
+        self.recipe.save()
+        self.assertEqual(self.get(self.reader)['name'], 'Борщ')
+        self.assertEqual(self.shared_representation.call_count, 3)
+
+    def test_fragment_holds_no_host(self):
+        """A forged Host only shows up in the response to its request."""
+        forged = self.client.get(self.path, HTTP_HOST='evil.example').data
+        self.assertTrue(forged['image'].startswith('http://evil.example/'))
+        data = self.get(self.reader)
+        self.assertEqual(self.shared_representation.call_count, 1)
+        urls = [data['image']] + [
+            url
+            for variant in data['image_variants'].values()
+            for url in variant.values()
+        ]
+        for url in urls:
+            self.assertTrue(url.startswith('http://testserver/media/'), url)
+
+
+def png_image(size=(800, 600), color='orange'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class RecipeImageTests(APITransactionTestCase):
+    """Recipe images as uploaded, then as processed by ``run_worker``.
+
+    Transactions are real so the worker's threads see the queued tasks.
+    """
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name, TASKS_EAGER=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+        self.user = User.objects.create_user(
+            'author', 'author@example.com', 'password'
+        )
+        self.tag = Tag.objects.create(
+            name='Обед', color='#49B64E', slug='lunch'
+        )
+        self.ingredient = Ingredient.objects.create(
+            name='морковь', measurement_unit='г'
+        )
+        self.client.force_authenticate(self.user)
+
+    def recipe_data(self, **data):
+        return {
+            'name': 'Суп',
+            'text': 'Варить.',
+            'cooking_time': 10,
+            'tags': [self.tag.pk],
+            'ingredients': [{'id': self.ingredient.pk, 'amount': 10}],
+            'image': 'data:image/png;base64,'
+                     + base64.b64encode(png_image()).decode(),
+            **data,
+        }
+
+    def multipart_data(self, image):
+        data = self.recipe_data(
+            image=SimpleUploadedFile('photo.png', image, 'image/png')
+        )
+        data['ingredients'] = json.dumps(data['ingredients'])
+        return data
+
+    def test_multipart_upload(self):
+        response = self.client.post(
+            '/api/recipes/', self.multipart_data(png_image()),
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        self.assertEqual(
+            recipe.image.name, f'recipes/{content_hash(png_image())}.png'
+        )
+
+    def test_upload_size_cap(self):
+        image = png_image()
+        data = self.multipart_data(image)
+        with override_settings(UPLOAD_MAX_SIZE=len(image) // 2):
+            response = self.client.post(
+                '/api/recipes/', data, format='multipart'
+            )
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Recipe.objects.exists())
+
+    def run_worker(self):
+        output = io.StringIO()
+        call_command('run_worker', '--once', '--threads', '1', stdout=output)
+        return output.getvalue()
+
+    def test_racing_saves(self):
+        """Saves that both missed the file end with one file, no retries."""
+        storage = ContentAddressedStorage()
+        name = f'recipes/{content_hash(png_image())}.png'
+        # One name per save: retrying under the same name raises instead
+        # of looping forever.
+        available_name = mock.patch.object(
+            storage, 'get_available_name', side_effect=[name, name]
+        )
+        with mock.patch.object(storage, 'exists', return_value=False):
+            with available_name:
+                for _ in range(2):
+                    self.assertEqual(
+                        storage.save(name, ContentFile(png_image())), name
+                    )
+        self.assertEqual(storage.listdir('recipes'), ([], [name[8:]]))
+        with storage.open(name) as file:
+            self.assertEqual(file.read(), png_image())
+
+    def test_variants(self):
+        """Identical uploads share the image and its variants."""
+        first, second = (
+            self.client.post(
+                '/api/recipes/', self.recipe_data(), format='json'
+            ).data['id']
+            for _ in range(2)
+        )
+        self.run_worker()
+        first, second = Recipe.objects.filter(pk__in=[first, second])
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image_variants, second.image_variants)
+        name = first.image.name
+        self.assertEqual(name, f'recipes/{content_hash(png_image())}.png')
+        for variant, (width, height) in VARIANTS.items():
+            names = first.image_variants[variant]
+            self.assertIn('jpeg', names)
+            for extension, derived in names.items():
+                self.assertEqual(
+                    derived, variant_name(name, variant, extension)
+                )
+                with first.image.storage.open(derived) as file:
+                    image = Image.open(file)
+                    self.assertLessEqual(image.width, width)
+                    self.assertLessEqual(image.height, height)
+
+    def test_variants_reach_cached_responses(self):
+        """The worker's fragment, built after the variants, is used."""
+        response = self.client.post(
+            '/api/recipes/', self.recipe_data(), format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        path = f'/api/recipes/{response.data["id"]}/'
+        self.client.force_authenticate(None)
+        variants = self.client.get(path).data['image_variants']
+        self.assertEqual(set(variants['card']), {'original'})
+        self.assertIn('prepare_recipe', self.run_worker())
+        with mock.patch.object(
+            RecipeSerializer, 'shared_representation'
+        ) as shared_representation:
+            variants = self.client.get(path).data['image_variants']
+        shared_representation.assert_not_called()
+        self.assertIn('jpeg', variants['card'])
+        self.assertNotIn('original', variants['card'])
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }
+    },
+    INGREDIENT_SEARCH_INDEX=False,
+)
+class QueryCountTests(APITestCase):
+    """Pins the number of queries per endpoint.
+
+    Every request is made twice: on a small page of a small dataset, then
+    on a larger page after adding more of everything the page touches.
+    Both must stay within the pinned maximum and match each other, so any
+    per-row query fails the test, listing the SQL it captured.
+    Caches are disabled to measure the full serialization path.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = [
+            Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (
+                ('Завтрак', '#E26C2D', 'breakfast'),
+                ('Обед', '#49B64E', 'lunch'),
+            )
+        ]
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'морковь {number}', measurement_unit='г')
+            for number in range(12)
+        )
+        cls.user = User.objects.create_user(
+            'reader', 'reader@example.com', 'password'
+        )
+        cls.authors = []
+        cls.add_data(2)
+
+    @classmethod
+    def add_data(cls, count):
+        """Adds authors with recipes the user follows, likes and buys."""
+        for _ in range(count):
+            number = User.objects.count()
+            author = User.objects.create_user(
+                f'author{number}', f'author{number}@example.com', 'password'
+            )
+            cls.authors.append(author)
+            Follow.objects.create(user=cls.user, author=author)
+            for _ in range(3):
+                cls.add_recipe(author)
+
+    @classmethod
+    def add_recipe(cls, author):
+        recipe = Recipe.objects.create(
+            author=author, name=f'Суп {Recipe.objects.count()}',
+            text='Варить.', cooking_time=10, image='recipes/test.jpg'
+        )
+        recipe.tags.set(cls.tags)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+            for ingredient in cls.ingredients[recipe.pk % 6:][:4]
+        )
+        for model in (FavouritesItem, ShoppingCartItem):
+            model.objects.add(cls.user, [recipe.pk])
+        return recipe
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, path, authenticated=True):
+        if not authenticated:
+            self.client.force_authenticate(None)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(path)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, path)
+        return context
+
+    def assertConstantQueries(
+        self, maximum, path, larger_path=None, authenticated=True
+    ):
+        small = self.count_queries(path, authenticated)
+        self.add_data(3)
+        large = self.count_queries(larger_path or path, authenticated)
+        for context, label in ((small, 'small'), (large, 'large')):
+            queries = '\n'.join(
+                f'{number}. {query["sql"]}'
+                for number, query in enumerate(context.captured_queries, 1)
+            )
+            message = (
+                f'{len(context)} queries on the {label} dataset of'
+                f' {path}, expected {maximum} at most and as many as on'
+                f' the other one ({len(small)} vs {len(large)}):\n{queries}'
+            )
+            self.assertLessEqual(len(context), maximum, message)
+            self.assertEqual(len(small), len(large), message)
+
+    def test_recipe_list(self):
+        self.assertConstantQueries(
+            5, '/api/recipes/?limit=2', '/api/recipes/?limit=12'
+        )
+
+    def test_recipe_list_anonymous(self):
+        self.assertConstantQueries(
+            5, '/api/recipes/?limit=2', '/api/recipes/?limit=12',
+            authenticated=False,
+        )
+
+    def test_recipe_list_cursor(self):
+        self.assertConstantQueries(
+            4, '/api/recipes/?pagination=cursor&limit=2',
+            '/api/recipes/?pagination=cursor&limit=12'
+        )
+
+    def test_recipe_list_filters(self):
+        for query in (
+            'is_favorited=1',
+            'is_in_shopping_cart=1',
+            'tags=breakfast&tags=lunch',
+            f'author={self.authors[0].pk}',
+            'search=морковь',
+        ):
+            with self.subTest(query=query):
+                self.assertConstantQueries(
+                    6, f'/api/recipes/?{query}&limit=2',
+                    f'/api/recipes/?{query}&limit=12'
+                )
+
+    def test_recipe_detail(self):
+        recipe = Recipe.objects.first()
+        self.assertConstantQueries(4, f'/api/recipes/{recipe.pk}/')
+
+    def test_recipe_detail_anonymous(self):
+        recipe = Recipe.objects.first()
+        self.assertConstantQueries(
+            4, f'/api/recipes/{recipe.pk}/', authenticated=False
+        )
+
+    def test_subscriptions(self):
+        self.assertConstantQueries(
+            3, '/api/users/subscriptions/?limit=2',
+            '/api/users/subscriptions/?limit=12'
+        )
+
+    def test_subscriptions_recipes_limit(self):
+        self.assertConstantQueries(
+            3, '/api/users/subscriptions/?limit=2&recipes_limit=1',
+            '/api/users/subscriptions/?limit=12&recipes_limit=2'
+        )
+
+    def test_user_list(self):
+        self.assertConstantQueries(
+            2, '/api/users/?limit=2', '/api/users/?limit=12'
+        )
+
+    def test_user_list_anonymous(self):
+        self.assertConstantQueries(
+            2, '/api/users/?limit=2', '/api/users/?limit=12',
+            authenticated=False,
+        )
+
+    def test_user_detail(self):
+        self.assertConstantQueries(1, f'/api/users/{self.authors[0].pk}/')
+
+    def test_ingredient_search(self):
+        self.assertConstantQueries(1, '/api/ingredients/?name=мор')
+
+    @override_settings(
+        INGREDIENT_SEARCH_INDEX=True, INGREDIENT_SEARCH_RECHECK=60
+    )
+    def test_ingredient_search_index(self):
+        """Lookups between version checks don't touch the database."""
+        ingredient_index.invalidate()
+        self.count_queries('/api/ingredients/?name=мо')
+        self.assertConstantQueries(
+            0, '/api/ingredients/?name=мор', '/api/ingredients/?name=морк'
+        )
+
+    def test_download_shopping_cart(self):
+        for file_format in ('txt', 'csv', 'json'):
+            with self.subTest(format=file_format):
+                self.assertConstantQueries(
+                    1,
+                    '/api/recipes/download_shopping_cart/'
+                    f'?format={file_format}'
+                )
+
+
+class UserListTests(APITestCase):
+    """``/api/users/`` is paginated like the rest of the API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(name, f'{name}@example.com', 'password')
+            for name in ('anna', 'boris', 'vera')
+        ]
+        Follow.objects.create(user=cls.users[0], author=cls.users[1])
+
+    def test_pages(self):
+        self.client.force_authenticate(self.users[0])
+        data = self.client.get('/api/users/?limit=2').data
+        self.assertEqual(set(data), {'count', 'next', 'previous', 'results'})
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(len(data['results']), 2)
+        self.assertIn('page=2', data['next'])
+        second = self.client.get(data['next']).data
+        results = data['results'] + second['results']
+        self.assertEqual(
+            {user['username']: user['is_subscribed'] for user in results},
+            {'anna': False, 'boris': True, 'vera': False},
+        )
+
+
+class CounterTests(APITestCase):
+    """The counters kept by signals match a recount after API writes."""
+
+    def setUp(self):
+        self.author, self.reader = (
+            User.objects.create_user(name, f'{name}@example.com', 'password')
+            for name in ('author', 'reader')
+        )
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.author, name=f'Суп {number}', text='Варить.',
+                cooking_time=10, image='recipes/test.jpg'
+            )
+            for number in range(3)
+        ]
+        self.client.force_authenticate(self.reader)
+
+    def assertCounters(self, recipes_count, followers_count, cart_size,
+                       favorites_counts):
+        author = UserStats.objects.get(user=self.author)
+        reader = UserStats.objects.get(user=self.reader)
+        self.assertEqual(
+            (author.recipes_count, author.followers_count, reader.cart_size),
+            (recipes_count, followers_count, cart_size),
+        )
+        self.assertEqual(
+            list(
+                Recipe.objects.order_by('pk')
+                .values_list('favorites_count', flat=True)
+            ),
+            favorites_counts,
+        )
+        output = io.StringIO()
+        call_command('recount', stdout=output)
+        self.assertIn('Fixed 0 user counters and 0 recipe', output.getvalue())
+
+    def test_counters(self):
+        self.assertCounters(3, 0, 0, [0, 0, 0])
+        first, second, third = (recipe.pk for recipe in self.recipes)
+        for path in (
+            f'/api/users/{self.author.pk}/subscribe/',
+            f'/api/recipes/{first}/favorite/',
+            f'/api/recipes/{second}/favorite/',
+            f'/api/recipes/{first}/shopping_cart/',
+            f'/api/recipes/{third}/shopping_cart/',
+        ):
+            self.assertEqual(self.client.post(path).status_code, 201, path)
+        self.assertCounters(3, 1, 2, [1, 1, 0])
+        response = self.client.get('/api/users/subscriptions/')
+        self.assertEqual(response.data['results'][0]['recipes_count'], 3)
+        for path in (
+            f'/api/users/{self.author.pk}/subscribe/',
+            f'/api/recipes/{first}/favorite/',
+            f'/api/recipes/{first}/shopping_cart/',
+        ):
+            self.assertEqual(self.client.delete(path).status_code, 204, path)
+        self.assertCounters(3, 0, 1, [0, 1, 0])
+        self.recipes[2].delete()
+        self.assertCounters(2, 0, 0, [0, 1])
+
+    def test_collection_errors(self):
+        recipe = self.recipes[0].pk
+        missing = Recipe.objects.order_by('pk').last().pk + 1
+        for collection in ('favorite', 'shopping_cart'):
+            path = f'/api/recipes/{recipe}/{collection}/'
+            with self.subTest(collection=collection):
+                self.assertEqual(self.client.post(path).status_code, 201)
+                self.assertEqual(self.client.post(path).status_code, 400)
+                self.assertEqual(self.client.delete(path).status_code, 204)
+                self.assertEqual(self.client.delete(path).status_code, 400)
+                path = f'/api/recipes/{missing}/{collection}/'
+                self.assertEqual(self.client.post(path).status_code, 404)
+                self.assertEqual(self.client.delete(path).status_code, 404)
+        self.assertCounters(3, 0, 0, [0, 0, 0])
+
+    def test_bulk_collections(self):
+        first, second, third = (recipe.pk for recipe in self.recipes)
+        missing = third + 1
+        self.client.post(f'/api/recipes/{first}/shopping_cart/')
+        response = self.client.post(
+            '/api/recipes/shopping_cart/',
+            {'ids': [first, second, missing, second, third]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual(
+            [(item['id'], item['status']) for item in results],
+            [(first, 400), (second, 201), (missing, 404), (third, 201)],
+        )
+        self.assertEqual(results[1]['recipe']['id'], second)
+        self.assertCounters(3, 0, 3, [0, 0, 0])
+        response = self.client.delete(
+            '/api/recipes/shopping_cart/', {'ids': [second, third]},
+            format='json'
+        )
+        self.assertEqual(
+            [item['status'] for item in response.data['results']], [204, 204]
+        )
+        self.assertCounters(3, 0, 1, [0, 0, 0])
+        for data in ({}, {'ids': []}, {'ids': ['x']}):
+            response = self.client.post(
+                '/api/recipes/favorite/', data, format='json'
+            )
+            self.assertEqual(response.status_code, 400, data)
+
+    def test_bulk_collections_queries(self):
+        """The number of queries doesn't grow with the number of ids."""
+        counts = []
+        for ids in ([self.recipes[0].pk], [r.pk for r in self.recipes[1:]]):
+            with CaptureQueriesContext(connection) as context:
+                self.client.post(
+                    '/api/recipes/favorite/', {'ids': ids}, format='json'
+                )
+            counts.append(len(context))
+        self.assertEqual(counts[0], counts[1])
+        self.assertCounters(3, 0, 0, [1, 1, 1])
+
+    def test_recount_repairs_counters(self):
+        UserStats.objects.update(recipes_count=7)
+        Recipe.objects.update(favorites_count=5)
+        output = io.StringIO()
+        call_command('recount', stdout=output)
+        self.assertIn('Fixed 2 user counters and 3 recipe', output.getvalue())
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).recipes_count, 3
+        )
+
+
+class BenchmarkTests(APITestCase):
+    """``benchmark`` runs every scenario against a generated dataset."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        call_command(
+            'generate_dataset', '--users', '4', '--batch-size', '50',
+            stdout=io.StringIO(),
+        )
+
+    def test_benchmark(self):
+        output = io.StringIO()
+        call_command(
+            'benchmark', '--iterations', '2', '--warmup', '0',
+            stdout=output, stderr=io.StringIO(),
+        )
+        report = json.loads(output.getvalue())
+        endpoints = {
+            result['name']: result for result in report['endpoints']
+        }
+        self.assertEqual(
+            endpoints['delete recipe']['route'], 'recipe-detail'
+        )
+        for name, result in endpoints.items():
+            with self.subTest(name=name):
+                self.assertLess(max(result['status']), 400)
+        self.assertFalse([
+            route for route in report['uncovered_routes']
+            if route.startswith('recipe')
+        ])
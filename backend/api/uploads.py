@@ -0,0 +1,54 @@
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.status import HTTP_413_REQUEST_ENTITY_TOO_LARGE
+from django.conf import settings
+from django.core.files.uploadhandler import (
+    FileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+
+
+class UploadTooLarge(APIException):
+    status_code = HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Загружаемый файл слишком большой.'
+    default_code = 'upload_too_large'
+
+
+class CappedUploadHandler(FileUploadHandler):
+    """Rejects uploads over ``UPLOAD_MAX_SIZE`` as early as possible.
+
+    A declared Content-Length is checked before the body is read, the
+    running size of every file is checked while it streams.
+    """
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):
+        if content_length > settings.UPLOAD_MAX_SIZE:
+            raise UploadTooLarge
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.UPLOAD_MAX_SIZE:
+            raise UploadTooLarge
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+class StreamingUploadMixin:
+    """Accepts multipart bodies, writing file parts to disk in chunks."""
+
+    parser_classes = [JSONParser, MultiPartParser]
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [
+            CappedUploadHandler(request),
+            TemporaryFileUploadHandler(request),
+        ]
+        return super().initialize_request(request, *args, **kwargs)
@@ -1,16 +1,52 @@
 from rest_framework.routers import DefaultRouter
+from django.conf import settings
 from django.urls import include, path
 
+from api.async_views import async_read_view
 from api.views import (
     FollowViewSet,
+    FoodgramUserViewSet,
     IngredientsViewSet,
     RecipesViewSet,
     TagsViewSet,
 )
 
 
+ASYNC_ROUTES = (
+    ('', False, {'get': 'list', 'post': 'create'}),
+    ('<int:pk>/', True, {
+        'get': 'retrieve',
+        'put': 'update',
+        'patch': 'partial_update',
+        'delete': 'destroy',
+    }),
+)
+
+
+def async_read_urls(registry):
+    """Async list and detail routes of the registered read endpoints."""
+    urls = []
+    for prefix, viewset, basename in registry:
+        if prefix == 'users':
+            continue
+        for suffix, detail, actions in ASYNC_ROUTES:
+            actions = {
+                method: action for method, action in actions.items()
+                if hasattr(viewset, action)
+            }
+            urls.append(path(
+                f'{prefix}/{suffix}',
+                async_read_view(
+                    viewset, actions, basename=basename, detail=detail
+                ),
+                name=f'{basename}-{"detail" if detail else "list"}',
+            ))
+    return urls
+
+
 router = DefaultRouter()
 router.register(r'users', FollowViewSet, basename='following')
+router.register(r'users', FoodgramUserViewSet, basename='user')
 router.register(r'tags', TagsViewSet)
 router.register(r'ingredients', IngredientsViewSet)
 router.register(r'recipes', RecipesViewSet)
@@ -18,6 +54,8 @@ router.register(r'recipes', RecipesViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.ASYNC_READS:
+    urlpatterns = async_read_urls(router.registry) + urlpatterns
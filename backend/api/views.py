@@ -1,4 +1,5 @@
 from django_filters.rest_framework import DjangoFilterBackend
+from djoser.views import UserViewSet
 from rest_framework.decorators import action
 from rest_framework.filters import SearchFilter
 from rest_framework.permissions import AllowAny, IsAuthenticated
@@ -7,37 +8,61 @@ from rest_framework.status import (
     HTTP_201_CREATED,
     HTTP_204_NO_CONTENT,
     HTTP_400_BAD_REQUEST,
+    HTTP_404_NOT_FOUND,
 )
 from rest_framework.viewsets import (
     GenericViewSet,
     ModelViewSet,
     ReadOnlyModelViewSet,
 )
+from django.conf import settings
 from django.db import IntegrityError
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db.models import F, Value
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
 from recipes.models import (
     FavouritesItem,
     Ingredient,
     Recipe,
-    ShoppingCart,
+    RecipeIngredient,
+    ShoppingCartItem,
     Tag,
 )
+from .cache import ConditionalGetMixin
 from .filters import IngredientSearchFilter, RecipeFilter
-from .pagination import FoodgramPagination
+from .pagination import CursorPaginationMixin, FoodgramPagination
+from .renderers import (
+    ShoppingListCSVRenderer,
+    ShoppingListJSONRenderer,
+    ShoppingListTextRenderer,
+)
+from .search import ingredient_index
 from .serializers.recipes_main import (
     IngredientSerializer,
     RecipeSerializer,
     TagSerializer,
 )
-from .serializers.recipes_misc import RecipeLiteSerializer
+from .serializers.recipes_misc import (
+    RecipeIdsSerializer,
+    RecipeLiteSerializer,
+)
 from .serializers.users_main import SubscriptionUserSerializer
-from users.models import Follow, User
+from .uploads import StreamingUploadMixin
+from users.models import Follow, User, annotate_is_subscribed
+
+
+class FoodgramUserViewSet(UserViewSet):
+    pagination_class = FoodgramPagination
 
+    def get_queryset(self):
+        """Resolves ``is_subscribed`` for the whole page in the same query."""
+        return annotate_is_subscribed(
+            super().get_queryset(), self.request.user
+        ).order_by('id')
 
-class FollowViewSet(GenericViewSet):
+
+class FollowViewSet(CursorPaginationMixin, GenericViewSet):
     serializer_class = SubscriptionUserSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [SearchFilter]
@@ -46,7 +71,11 @@ class FollowViewSet(GenericViewSet):
 
     @action(detail=False)
     def subscriptions(self, request):
-        following = User.objects.filter(followers__user=request.user)
+        following = User.objects.filter(
+            followers__user=request.user
+        ).select_related('stats').annotate(
+            is_subscribed=Value(True)
+        ).order_by('-id')
         page = self.paginate_queryset(following)
         if page is not None:
             serializer = SubscriptionUserSerializer(
@@ -92,24 +121,61 @@ class FollowViewSet(GenericViewSet):
         return Response(status=HTTP_204_NO_CONTENT)
 
 
-class TagsViewSet(ReadOnlyModelViewSet):
+class TagsViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    version_models = (Tag,)
+    cache_responses = True
 
 
-class IngredientsViewSet(ReadOnlyModelViewSet):
+class IngredientsViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientSearchFilter
+    version_models = (Ingredient,)
+    cache_responses = True
+
+    def list(self, request, *args, **kwargs):
+        """Serves name searches from the in-memory index when enabled."""
+        name = request.query_params.get('name')
+        if name and settings.INGREDIENT_SEARCH_INDEX:
+            return self.conditional_response(self.search, request, name)
+        return super().list(request, *args, **kwargs)
+
+    def search(self, request, name):
+        return Response(
+            ingredient_index.search(name, settings.INGREDIENT_SEARCH_LIMIT)
+        )
 
 
-class RecipesViewSet(ModelViewSet):
+class RecipesViewSet(
+    ConditionalGetMixin,
+    CursorPaginationMixin,
+    StreamingUploadMixin,
+    ModelViewSet,
+):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
+    lookup_value_regex = r'\d+'
     pagination_class = FoodgramPagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
+    version_models = (Recipe, RecipeIngredient, Tag, Ingredient, User)
+    user_dependent = True
+    cache_responses = True
+
+    def get_queryset(self):
+        """Resolves per-user flags for the whole page in the same query.
+
+        Reading actions also load the related objects in bulk, so a page
+        costs the same number of queries whatever its size.
+        """
+        user = self.request.user
+        queryset = Recipe.objects.with_user_flags(user)
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.with_related(user)
+        return queryset
 
     def get_permissions(self):
         if self.action in ('list', 'retrieve'):
@@ -119,45 +185,96 @@ class RecipesViewSet(ModelViewSet):
         return [permission() for permission in permission_classes]
 
     COLLECTIONS = {
-        'shopping_cart': (ShoppingCart, 'shopping cart'),
-        'remove_from_shopping_cart': (ShoppingCart, 'shopping cart'),
+        'shopping_cart': (ShoppingCartItem, 'shopping cart'),
+        'remove_from_shopping_cart': (ShoppingCartItem, 'shopping cart'),
+        'bulk_shopping_cart': (ShoppingCartItem, 'shopping cart'),
+        'bulk_remove_from_shopping_cart': (ShoppingCartItem, 'shopping cart'),
         'favorite': (FavouritesItem, 'favourites'),
-        'remove_from_favourites': (FavouritesItem, 'favourites')
+        'remove_from_favourites': (FavouritesItem, 'favourites'),
+        'bulk_favorite': (FavouritesItem, 'favourites'),
+        'bulk_remove_from_favourites': (FavouritesItem, 'favourites'),
     }
 
     def add_recipe(self, request, pk=None):
-        """ Validates the recipe vs. collection & adds if doesn't exist. """
+        """Adds the recipe unless it's already in the collection.
+
+        The unique constraint decides, in the single ``INSERT``.
+        """
         model_type, name = self.COLLECTIONS.get(self.action)
-        recipe = get_object_or_404(Recipe, id=pk)
-        collection, _ = model_type.objects.get_or_create(user=request.user)
-        if collection.recipes.filter(id__exact=recipe.id).exists():
+        recipe = get_object_or_404(
+            Recipe.objects.only(*RecipeLiteSerializer.Meta.fields), id=pk
+        )
+        if not model_type.objects.add(request.user, [recipe.pk]):
             return Response(
                 {'errors': f'Already in the {name}.'},
                 status=HTTP_400_BAD_REQUEST
             )
-        collection.recipes.add(recipe)
-        return recipe
+        return Response(
+            RecipeLiteSerializer(recipe).data,
+            status=HTTP_201_CREATED,
+        )
 
-    def remove_recipe(self, request, pk=None) -> None:
-        """Validates the recipe vs. collection & removes if present."""
+    def remove_recipe(self, request, pk=None):
+        """Removes the recipe if it's in the collection, in one ``DELETE``.
 
+        The recipe is only looked up to tell a 404 from a 400.
+        """
         model_type, name = self.COLLECTIONS.get(self.action)
-        recipe = get_object_or_404(Recipe, id=pk)
-        collection, _ = model_type.objects.get_or_create(user=request.user)
-        if not collection.recipes.filter(id__exact=recipe.id).exists():
+        if not model_type.objects.remove(request.user, [pk]):
+            get_object_or_404(Recipe, id=pk)
             return Response(
                 {'errors': f'Not in {name}.'},
                 status=HTTP_400_BAD_REQUEST
             )
-        collection.recipes.remove(recipe)
         return Response(status=HTTP_204_NO_CONTENT)
 
+    def change_recipes(self, request, add):
+        """Adds or removes a list of recipes in two queries whatever its size.
+
+        One query finds the existing recipes, one statement changes the
+        collection. Every id gets the status and body the single-recipe
+        action would have answered with.
+        """
+        model_type, name = self.COLLECTIONS.get(self.action)
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        recipes = Recipe.objects.only(
+            *RecipeLiteSerializer.Meta.fields
+        ).in_bulk(ids)
+        if add:
+            changed = model_type.objects.add(request.user, list(recipes))
+        else:
+            changed = model_type.objects.remove(request.user, list(recipes))
+        changed = set(changed)
+        results = []
+        for pk in ids:
+            if pk not in recipes:
+                results.append({
+                    'id': pk, 'status': HTTP_404_NOT_FOUND,
+                    'errors': 'Not found.',
+                })
+            elif pk not in changed:
+                results.append({
+                    'id': pk, 'status': HTTP_400_BAD_REQUEST,
+                    'errors': (
+                        f'Already in the {name}.' if add else f'Not in {name}.'
+                    ),
+                })
+            elif add:
+                results.append({
+                    'id': pk, 'status': HTTP_201_CREATED,
+                    'recipe': RecipeLiteSerializer(recipes[pk]).data,
+                })
+            else:
+                results.append({'id': pk, 'status': HTTP_204_NO_CONTENT})
+        return Response({'results': results})
+
     @action(detail=True, name="Add to shopping cart", methods=['POST'])
     def shopping_cart(self, request, pk=None):
         """Adds a recipe to the shopping cart."""
 
-        recipe = self.add_recipe(request, pk=pk)
-        return Response(RecipeLiteSerializer(recipe).data)
+        return self.add_recipe(request, pk=pk)
 
     @shopping_cart.mapping.delete
     def remove_from_shopping_cart(self, request, pk=None):
@@ -169,39 +286,77 @@ class RecipesViewSet(ModelViewSet):
     def favorite(self, request, pk=None):
         """Adds a recipe to favourites."""
 
-        recipe = self.add_recipe(request, pk=pk)
-        return Response(RecipeLiteSerializer(recipe).data)
+        return self.add_recipe(request, pk=pk)
 
     @favorite.mapping.delete
     def remove_from_favourites(self, request, pk=None):
         """Removes a recipe from favourites."""
 
-        self.remove_recipe(request, pk=pk)
-        return Response(status=HTTP_204_NO_CONTENT)
+        return self.remove_recipe(request, pk=pk)
 
-    @action(detail=False)
+    @action(
+        detail=False, methods=['POST'], url_path='shopping_cart',
+        url_name='shopping-cart-bulk', name="Add to shopping cart in bulk",
+    )
+    def bulk_shopping_cart(self, request):
+        """Adds the recipes listed in ``ids`` to the shopping cart."""
+
+        return self.change_recipes(request, add=True)
+
+    @bulk_shopping_cart.mapping.delete
+    def bulk_remove_from_shopping_cart(self, request):
+        """Removes the recipes listed in ``ids`` from the shopping cart."""
+
+        return self.change_recipes(request, add=False)
+
+    @action(
+        detail=False, methods=['POST'], url_path='favorite',
+        url_name='favorite-bulk', name="Add to favourites in bulk",
+    )
+    def bulk_favorite(self, request):
+        """Adds the recipes listed in ``ids`` to favourites."""
+
+        return self.change_recipes(request, add=True)
+
+    @bulk_favorite.mapping.delete
+    def bulk_remove_from_favourites(self, request):
+        """Removes the recipes listed in ``ids`` from favourites."""
+
+        return self.change_recipes(request, add=False)
+
+    @action(
+        detail=False,
+        renderer_classes=[
+            ShoppingListTextRenderer,
+            ShoppingListCSVRenderer,
+            ShoppingListJSONRenderer,
+        ],
+    )
     def download_shopping_cart(self, request):
-        """Returns the shopping cart aggregated contents as a file."""
+        """Streams the shopping cart aggregated contents as a file.
 
-        recipes = (
-            request.user.shoppingcart.recipes.prefetch_related('ingredients')
-        )
-        ingredients = (
-            recipes.order_by('ingredients__name')
-            .values('ingredients__name', 'ingredients__measurement_unit')
-            .annotate(total=Sum('recipeingredient__amount'))
-        )
-        ingredients_list = ''
-        for ingredient in ingredients:
-            ingredients_list += (
-                f'{ingredient.get("ingredients__name")}'
-                f' — {ingredient.get("total")}'
-                f' {ingredient.get("ingredients__measurement_unit")}.\r\n'
+        The format is picked with ``?format=txt|csv|json`` (or the Accept
+        header) and defaults to plain text.
+
+        The rows are read before returning: under ASGI the body is iterated
+        in the event loop, where the ORM can't be called. The list holds at
+        most one row per ingredient, only the rendering is streamed.
+        """
+        ingredients = list(
+            request.user.shopping_list
+            .values(
+                'total',
+                name=F('ingredient__name'),
+                measurement_unit=F('ingredient__measurement_unit'),
             )
-        response = HttpResponse(
-            ingredients_list, content_type='text/plain,charset=utf8'
+            .order_by('name')
+        )
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
         )
         response['Content-Disposition'] = (
-            f'attachment; filename={"shopping_list.txt"}'
+            f'attachment; filename=shopping_list.{renderer.format}'
         )
         return response
@@ -33,14 +33,19 @@ INSTALLED_APPS = [
     'recipes',
     'api',
     'users',
+    'tasks',
+    'monitoring',
 ]
 
 MIDDLEWARE = [
+    'monitoring.middleware.MetricsMiddleware',
+    'monitoring.middleware.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'monitoring.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -77,6 +82,14 @@ DATABASES = {
     }
 }
 
+# Per-process locmem by default. Cache versions live there too, so any
+# deployment with several processes (gunicorn workers, run_worker) needs a
+# shared backend, e.g. dbcache://cache_table as in docker-compose.yml.
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+RESPONSE_CACHE_TIMEOUT = env.int('RESPONSE_CACHE_TIMEOUT', default=60 * 60)
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -106,6 +119,40 @@ STATIC_ROOT = BASE_DIR.joinpath('static/')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR.joinpath('media/')
 
+# Request profiles, see monitoring.middleware.ProfilingMiddleware
+PROFILES_ROOT = BASE_DIR.joinpath('profiles/')
+PROFILING_SAMPLE_RATE = env.float('PROFILING_SAMPLE_RATE', default=0.0)
+
+# Statements over the threshold are logged as JSON lines, 0 turns it off;
+# see monitoring.middleware.SlowQueryMiddleware and `manage.py slow_queries`
+SLOW_QUERY_THRESHOLD_MS = env.float('SLOW_QUERY_THRESHOLD_MS', default=100.0)
+SLOW_QUERY_LOG = env.str(
+    'SLOW_QUERY_LOG', default=str(BASE_DIR.joinpath('logs/slow_queries.log'))
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'monitoring.log.JsonFormatter'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'monitoring.log.FileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'formatter': 'json',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'monitoring.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -133,3 +180,25 @@ DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
 }
+
+# In-memory autocomplete index for /api/ingredients/?name=
+INGREDIENT_SEARCH_INDEX = env.bool('INGREDIENT_SEARCH_INDEX', default=True)
+INGREDIENT_SEARCH_LIMIT = env.int('INGREDIENT_SEARCH_LIMIT', default=20)
+# Seconds between checks of the shared ingredient version by each process
+INGREDIENT_SEARCH_RECHECK = env.float('INGREDIENT_SEARCH_RECHECK', default=5.0)
+
+# Dotted path to a recipes.search.SearchBackend; picked by database if empty.
+# recipes.search.PostgreSQLSearchBackend is opt-in, see its docstring
+SEARCH_BACKEND = env.str('SEARCH_BACKEND', default='')
+
+# Async views for recipe, tag and ingredient reads, for ASGI deployments
+ASYNC_READS = env.bool('ASYNC_READS', default=False)
+
+# Size cap of a multipart recipe upload, bytes
+UPLOAD_MAX_SIZE = env.int('UPLOAD_MAX_SIZE', default=10 * 1024 * 1024)
+
+# Background tasks run by `manage.py run_worker`; eager runs them on commit
+TASKS_EAGER = env.bool('TASKS_EAGER', default=False)
+TASKS_MAX_ATTEMPTS = env.int('TASKS_MAX_ATTEMPTS', default=3)
+# Seconds after which a running task is considered lost and run again
+TASKS_LEASE = env.int('TASKS_LEASE', default=300)
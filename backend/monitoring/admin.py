@@ -0,0 +1,69 @@
+import io
+import json
+import pstats
+
+from django.contrib import admin
+from django.http import FileResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+
+from .models import RequestProfile
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        'created_at', 'method', 'path', 'status', 'duration_ms',
+        'query_count', 'query_ms', 'user',
+    )
+    list_filter = ('route', 'method', 'status')
+    search_fields = ('path',)
+    fields = (
+        'created_at', 'user', 'method', 'path', 'route', 'status',
+        'duration_ms', 'query_count', 'query_ms', 'download', 'top_functions',
+        'sql_trace',
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/download/',
+                self.admin_site.admin_view(self.download_view),
+                name='monitoring_requestprofile_download',
+            ),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        record = get_object_or_404(RequestProfile, pk=pk)
+        return FileResponse(
+            record.profile.open('rb'), as_attachment=True,
+            filename=f'request-{record.pk}.prof',
+        )
+
+    @admin.display(description='Профиль')
+    def download(self, record):
+        return format_html(
+            '<a href="{}">request-{}.prof</a>',
+            reverse('admin:monitoring_requestprofile_download',
+                    args=[record.pk]),
+            record.pk,
+        )
+
+    @admin.display(description='Функции по суммарному времени')
+    def top_functions(self, record):
+        output = io.StringIO()
+        stats = pstats.Stats(record.profile.path, stream=output)
+        stats.sort_stats('cumulative').print_stats(40)
+        return format_html('<pre>{}</pre>', output.getvalue())
+
+    @admin.display(description='SQL-запросы')
+    def sql_trace(self, record):
+        return format_html(
+            '<pre>{}</pre>',
+            json.dumps(record.queries, ensure_ascii=False, indent=2),
+        )
@@ -0,0 +1,38 @@
+import json
+import logging
+import os
+from datetime import datetime, timezone
+
+
+RECORD_ATTRIBUTES = {
+    *logging.makeLogRecord({}).__dict__, 'message', 'asctime',
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the ``extra`` fields of the record."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(
+                record.created, timezone.utc
+            ).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(
+            (key, value) for key, value in record.__dict__.items()
+            if key not in RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class FileHandler(logging.FileHandler):
+    """Creates the directory of the log file on the first record."""
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
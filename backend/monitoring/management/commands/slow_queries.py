@@ -0,0 +1,110 @@
+import json
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def summarize(entries):
+    """Slow statements grouped by fingerprint, by total time first."""
+    groups = defaultdict(list)
+    for entry in entries:
+        groups[entry['fingerprint_id']].append(entry)
+    summary = []
+    for key, group in groups.items():
+        durations = sorted(entry['ms'] for entry in group)
+        summary.append({
+            'fingerprint_id': key,
+            'fingerprint': group[0]['fingerprint'],
+            'count': len(group),
+            'total_ms': round(sum(durations), 3),
+            'mean_ms': round(sum(durations) / len(durations), 3),
+            'max_ms': durations[-1],
+            'max_duplicates': max(entry['duplicates'] for entry in group),
+            'routes': Counter(
+                entry['route'] for entry in group
+            ).most_common(),
+            'functions': Counter(
+                entry['function'] or '-' for entry in group
+            ).most_common(),
+        })
+    return sorted(summary, key=lambda item: -item['total_ms'])
+
+
+class Command(BaseCommand):
+    help = (
+        'Summarizes the slow query log: statements grouped by fingerprint'
+        ' with their count, total, mean and max time, the most times they'
+        ' ran in a single request, and the routes and functions they came'
+        ' from.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'files', nargs='*',
+            help='Log files to read; defaults to SLOW_QUERY_LOG.'
+        )
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--route', help='Only statements of this route.')
+        parser.add_argument(
+            '--since',
+            help='Only entries from this ISO 8601 time on, UTC by default.'
+        )
+        parser.add_argument(
+            '--json', action='store_true', dest='as_json',
+            help='Print the summary as JSON.'
+        )
+
+    def read(self, files, route, since):
+        entries = []
+        for name in files:
+            try:
+                with open(name, encoding='utf-8') as file:
+                    lines = list(file)
+            except OSError as error:
+                raise CommandError(f'Cannot read {name}: {error}')
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if 'fingerprint_id' not in entry:
+                    continue
+                if route and entry['route'] != route:
+                    continue
+                if since and datetime.fromisoformat(entry['time']) < since:
+                    continue
+                entries.append(entry)
+        return entries
+
+    def handle(self, *args, files, limit, route, since, as_json, **options):
+        if since:
+            try:
+                since = datetime.fromisoformat(since)
+            except ValueError:
+                raise CommandError(f'Not an ISO 8601 time: {since}')
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+        entries = self.read(files or [settings.SLOW_QUERY_LOG], route, since)
+        summary = summarize(entries)[:limit]
+        if as_json:
+            self.stdout.write(
+                json.dumps(summary, ensure_ascii=False, indent=2)
+            )
+            return
+        if not summary:
+            self.stdout.write('No slow queries logged.')
+            return
+        for item in summary:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{item["fingerprint_id"]}  {item["count"]} times,'
+                f' {item["total_ms"]} ms total, {item["mean_ms"]} ms mean,'
+                f' {item["max_ms"]} ms max,'
+                f' up to {item["max_duplicates"]} per request'
+            ))
+            self.stdout.write(f'  {item["fingerprint"]}')
+            for label, key in (('routes', 'routes'), ('from', 'functions')):
+                self.stdout.write(f'  {label}: ' + ', '.join(
+                    f'{name} ({count})' for name, count in item[key]
+                ))
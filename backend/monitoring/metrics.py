@@ -0,0 +1,64 @@
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+
+# With PROMETHEUS_MULTIPROC_DIR set, every worker writes its samples to
+# its own files there and a scrape merges them, whichever worker serves it.
+MULTIPROCESS = 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+if MULTIPROCESS:
+    # gunicorn's on_starting hook creates it afresh; runserver and
+    # management commands would otherwise fail on their first sample.
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+REQUESTS = Counter(
+    'foodgram_http_requests_total',
+    'Requests by route, method and status.',
+    ['route', 'method', 'status'],
+)
+LATENCY = Histogram(
+    'foodgram_http_request_duration_seconds',
+    'Time to build the response.',
+    ['route', 'method'],
+    buckets=(
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf')
+    ),
+)
+QUERIES = Histogram(
+    'foodgram_db_queries_per_request',
+    'SQL queries run per request.',
+    ['route', 'method'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, float('inf')),
+)
+QUERY_TIME = Histogram(
+    'foodgram_db_query_duration_seconds_per_request',
+    'Total time spent in SQL queries per request.',
+    ['route', 'method'],
+    buckets=(
+        0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, float('inf')
+    ),
+)
+RESPONSE_SIZE = Histogram(
+    'foodgram_http_response_size_bytes',
+    'Response body size.',
+    ['route', 'method'],
+    buckets=tuple(4 ** power * 256 for power in range(9)) + (float('inf'),),
+)
+
+
+def render():
+    """Exposition of the metrics of this process, or of all workers."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,231 @@
+import asyncio
+import cProfile
+import logging
+import marshal
+import random
+import time
+import uuid
+
+from asgiref.sync import async_to_sync, sync_to_async
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+
+from .metrics import LATENCY, QUERIES, QUERY_TIME, REQUESTS, RESPONSE_SIZE
+from .models import RequestProfile
+from .queries import QueryCounter, QueryLog, SlowQueryLog, collect_queries
+
+
+slow_query_logger = logging.getLogger('monitoring.slow_queries')
+
+
+def route_name(request):
+    """URL name plus the viewset action, e.g. ``recipe-list:create``.
+
+    Requests that resolve to no view are reported as ``unmatched``, so
+    scanners can't blow up the number of series.
+    """
+    match = request.resolver_match
+    if match is None:
+        return 'unmatched'
+    name = match.url_name or match.func.__name__
+    action = getattr(match.func, 'actions', {}).get(request.method.lower())
+    return f'{name}:{action}' if action else name
+
+
+def count_bytes(content, observe):
+    size = 0
+    for chunk in content:
+        size += len(chunk)
+        yield chunk
+    observe(size)
+
+
+class SyncAndAsyncMiddleware:
+    """Runs in the mode of the handler, so ASGI requests keep no thread.
+
+    Subclasses implement ``handle`` and ``ahandle``, the sync and async
+    bodies of ``__call__``. Queries are collected with ``collect_queries``,
+    which also sees those of sync views run in a thread by async requests.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Makes the instance pass for a coroutine function, like
+            # django.utils.deprecation.MiddlewareMixin does.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.ahandle(request)
+        return self.handle(request)
+
+
+class MetricsMiddleware(SyncAndAsyncMiddleware):
+    """Records per-route request, latency, SQL and response size metrics."""
+
+    def handle(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with collect_queries(counter):
+            response = self.get_response(request)
+        return self.record(request, response, counter, started)
+
+    async def ahandle(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with collect_queries(counter):
+            response = await self.get_response(request)
+        return self.record(request, response, counter, started)
+
+    def record(self, request, response, counter, started):
+        elapsed = time.perf_counter() - started
+        labels = {'route': route_name(request), 'method': request.method}
+        REQUESTS.labels(status=response.status_code, **labels).inc()
+        LATENCY.labels(**labels).observe(elapsed)
+        QUERIES.labels(**labels).observe(counter.count)
+        QUERY_TIME.labels(**labels).observe(counter.duration)
+        observe_size = RESPONSE_SIZE.labels(**labels).observe
+        if response.streaming:
+            response.streaming_content = count_bytes(
+                response.streaming_content, observe_size
+            )
+        else:
+            observe_size(len(response.content))
+        return response
+
+
+class SlowQueryMiddleware(SyncAndAsyncMiddleware):
+    """Logs statements slower than ``SLOW_QUERY_THRESHOLD_MS``.
+
+    Each one goes to the ``monitoring.slow_queries`` logger with the route,
+    the project function that ran it, its fingerprint and how many times
+    that fingerprint ran in the request, which tells N+1 patterns from
+    single heavy queries.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_THRESHOLD_MS:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.threshold = settings.SLOW_QUERY_THRESHOLD_MS / 1000
+
+    def handle(self, request):
+        log = SlowQueryLog(self.threshold)
+        with collect_queries(log):
+            response = self.get_response(request)
+        self.report(request, log)
+        return response
+
+    async def ahandle(self, request):
+        log = SlowQueryLog(self.threshold)
+        with collect_queries(log):
+            response = await self.get_response(request)
+        self.report(request, log)
+        return response
+
+    def report(self, request, log):
+        for query in log.records():
+            slow_query_logger.warning('slow query', extra={
+                'route': route_name(request),
+                'method': request.method,
+                'path': request.path,
+                'request_queries': log.count,
+                **query,
+            })
+
+
+class ProfilingMiddleware(SyncAndAsyncMiddleware):
+    """Profiles requests of staff sending ``X-Profile`` and a random sample.
+
+    The profile covers building the response, streamed bodies excepted, and
+    is saved as a ``RequestProfile`` whose id comes back in ``X-Profile-Id``.
+    Other requests only pay for a header lookup and, with a sample rate
+    set, one random number.
+
+    cProfile only sees the thread it is enabled in, so an async request
+    being profiled runs the rest of the chain from a worker thread: its sync
+    views then run in that same thread.
+    """
+
+    header = 'X-Profile'
+
+    def handle(self, request):
+        user = self.profiled_user(request)
+        if user is None:
+            return self.get_response(request)
+        return self.profile(request, user, self.get_response)
+
+    async def ahandle(self, request):
+        user = None
+        if self.header in request.headers:
+            user = await sync_to_async(self.staff_user)(request)
+        user = user or self.sampled_user()
+        if user is None:
+            return await self.get_response(request)
+        return await sync_to_async(self.profile)(
+            request, user, async_to_sync(self.get_response)
+        )
+
+    def profiled_user(self, request):
+        """The user to record, ``AnonymousUser`` if sampled, else None."""
+        user = None
+        if self.header in request.headers:
+            user = self.staff_user(request)
+        return user or self.sampled_user()
+
+    def staff_user(self, request):
+        user = request.user
+        if not user.is_authenticated:
+            try:
+                user = TokenAuthentication().authenticate(request)
+            except AuthenticationFailed:
+                user = None
+            user = user[0] if user else None
+        return user if user is not None and user.is_staff else None
+
+    @staticmethod
+    def sampled_user():
+        rate = settings.PROFILING_SAMPLE_RATE
+        if rate and random.random() < rate:
+            return AnonymousUser()
+        return None
+
+    def profile(self, request, user, get_response):
+        profiler = cProfile.Profile()
+        log = QueryLog()
+        started = time.perf_counter()
+        with collect_queries(log):
+            profiler.enable()
+            try:
+                response = get_response(request)
+            finally:
+                profiler.disable()
+        elapsed = time.perf_counter() - started
+        profiler.create_stats()
+        record = RequestProfile(
+            user=user if user.is_authenticated else None,
+            method=request.method,
+            path=request.get_full_path(),
+            route=route_name(request),
+            status=response.status_code,
+            duration_ms=round(elapsed * 1000, 3),
+            query_count=log.count,
+            query_ms=round(log.duration * 1000, 3),
+            queries=log.queries,
+        )
+        record.profile.save(
+            f'{uuid.uuid4().hex}.prof',
+            ContentFile(marshal.dumps(profiler.stats)),
+            save=False,
+        )
+        record.save()
+        response['X-Profile-Id'] = record.pk
+        return response
@@ -0,0 +1,40 @@
+# Generated by Django 4.0.1 on 2026-10-17 23:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import monitoring.models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+                ('method', models.CharField(max_length=10, verbose_name='Метод')),
+                ('path', models.TextField(verbose_name='Адрес')),
+                ('route', models.CharField(max_length=200, verbose_name='Маршрут')),
+                ('status', models.PositiveSmallIntegerField(verbose_name='Статус')),
+                ('duration_ms', models.FloatField(verbose_name='Время, мс')),
+                ('query_count', models.PositiveIntegerField(verbose_name='Запросов к БД')),
+                ('query_ms', models.FloatField(verbose_name='Время в БД, мс')),
+                ('profile', models.FileField(storage=monitoring.models.profile_storage, upload_to='', verbose_name='Профиль (.prof)')),
+                ('queries', models.JSONField(default=list, verbose_name='SQL-запросы')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Профиль запроса',
+                'verbose_name_plural': 'Профили запросов',
+                'ordering': ['-id'],
+            },
+        ),
+    ]
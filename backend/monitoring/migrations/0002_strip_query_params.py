@@ -0,0 +1,27 @@
+# Generated by Django 4.0.1 on 2026-10-18 12:00
+
+from django.db import migrations
+
+
+def strip_params(apps, schema_editor):
+    RequestProfile = apps.get_model('monitoring', 'RequestProfile')
+    profiles = RequestProfile.objects.only('queries')
+    for profile in profiles.iterator():
+        queries = [
+            {key: value for key, value in query.items() if key != 'params'}
+            for query in profile.queries
+        ]
+        if queries != profile.queries:
+            profile.queries = queries
+            profile.save(update_fields=['queries'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(strip_params, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+
+
+class ProfileStorage(FileSystemStorage):
+    """Files under ``PROFILES_ROOT``, read when used rather than on import.
+
+    Kept out of MEDIA_ROOT, which nginx serves to everyone.
+    """
+
+    @property
+    def base_location(self):
+        return settings.PROFILES_ROOT
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+
+def profile_storage():
+    return ProfileStorage()
+
+
+class RequestProfile(models.Model):
+    """cProfile output and SQL trace of a single sampled request."""
+
+    created_at = models.DateTimeField(
+        auto_now_add=True, verbose_name='Создан'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True,
+        blank=True, verbose_name='Пользователь'
+    )
+    method = models.CharField(max_length=10, verbose_name='Метод')
+    path = models.TextField(verbose_name='Адрес')
+    route = models.CharField(max_length=200, verbose_name='Маршрут')
+    status = models.PositiveSmallIntegerField(verbose_name='Статус')
+    duration_ms = models.FloatField(verbose_name='Время, мс')
+    query_count = models.PositiveIntegerField(verbose_name='Запросов к БД')
+    query_ms = models.FloatField(verbose_name='Время в БД, мс')
+    profile = models.FileField(
+        storage=profile_storage, verbose_name='Профиль (.prof)'
+    )
+    queries = models.JSONField(default=list, verbose_name='SQL-запросы')
+
+    class Meta:
+        verbose_name = 'Профиль запроса'
+        verbose_name_plural = 'Профили запросов'
+        ordering = ['-id']
+
+    def __str__(self) -> str:
+        return f'{self.method} {self.path}'
@@ -0,0 +1,203 @@
+import hashlib
+import os
+import re
+import sys
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.conf import settings
+
+
+FINGERPRINT_RULES = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+MONITORING_DIR = os.path.dirname(__file__)
+
+
+collectors = ContextVar('query_collectors', default=())
+
+
+def dispatch(execute, sql, params, many, context):
+    """``execute_wrapper`` of every connection, see ``collect_queries``."""
+    for collector in reversed(collectors.get()):
+        execute = partial(collector, execute)
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def collect_queries(collector):
+    """Passes the queries run in the current context to the collector.
+
+    Unlike ``connection.execute_wrapper`` it covers every thread the context
+    is carried to, such as the thread an async request runs a sync view in.
+    """
+    token = collectors.set((*collectors.get(), collector))
+    try:
+        yield collector
+    finally:
+        collectors.reset(token)
+
+
+class QueryCounter:
+    """``execute_wrapper`` that counts queries and their database time."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+def fingerprint(sql):
+    """The statement with literals, parameters and value lists collapsed.
+
+    Queries differing only in values, or in the length of an ``IN`` list,
+    share a fingerprint.
+    """
+    for pattern, replacement in FINGERPRINT_RULES:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint_id(fingerprint):
+    return hashlib.md5(fingerprint.encode()).hexdigest()[:12]
+
+
+def is_app_file(filename, root):
+    return (
+        filename.startswith(root)
+        and 'site-packages' not in filename
+        and not filename.startswith(MONITORING_DIR)
+    )
+
+
+def app_frame():
+    """Innermost project function on the stack and its location.
+
+    Methods are qualified with the class of the instance, e.g.
+    ``('SubscriptionUserSerializer.get_recipes', 'api/...py:42')``.
+    """
+    root = str(settings.BASE_DIR)
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if is_app_file(code.co_filename, root):
+            owner = frame.f_locals.get('self', frame.f_locals.get('cls'))
+            name = code.co_name
+            if owner is not None:
+                owner = owner if isinstance(owner, type) else type(owner)
+                name = f'{owner.__name__}.{name}'
+            location = f'{code.co_filename[len(root) + 1:]}:{frame.f_lineno}'
+            return name, location
+        frame = frame.f_back
+    return None, None
+
+
+def app_frames(limit=5):
+    """Innermost project frames of the current stack, outermost first.
+
+    Frames of installed packages and of this app are left out, so the
+    result points at the view, filter or serializer that ran the query.
+    """
+    root = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if is_app_file(frame.filename, root)
+    ]
+    return [
+        f'{frame.filename[len(root) + 1:]}:{frame.lineno} in {frame.name}'
+        for frame in frames[-limit:]
+    ]
+
+
+class QueryLog(QueryCounter):
+    """Also keeps every statement with its timing and call site.
+
+    Parameter values are left out: they carry tokens, password hashes and
+    emails, and profiles are kept for as long as staff want them.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.duration += duration
+            self.count += 1
+            self.queries.append({
+                'sql': sql,
+                'many': many,
+                'ms': round(duration * 1000, 3),
+                'stack': app_frames(),
+            })
+
+
+class SlowQueryLog(QueryCounter):
+    """Keeps statements slower than ``threshold`` seconds with their origin.
+
+    Every statement is counted, so the slow ones can be reported with how
+    many times their fingerprint ran in the request; fingerprints are only
+    computed when there is something to report.
+    """
+
+    def __init__(self, threshold):
+        super().__init__()
+        self.threshold = threshold
+        self.statements = Counter()
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.duration += duration
+            self.count += 1
+            self.statements[sql] += 1
+            if duration >= self.threshold:
+                function, location = app_frame()
+                self.slow.append({
+                    'sql': sql,
+                    'ms': round(duration * 1000, 3),
+                    'function': function,
+                    'location': location,
+                })
+
+    def records(self):
+        """Slow statements with their fingerprint and duplicate count."""
+        if not self.slow:
+            return []
+        fingerprints, counts = {}, Counter()
+        for sql, count in self.statements.items():
+            fingerprints[sql] = fingerprint(sql)
+            counts[fingerprints[sql]] += count
+        return [
+            {
+                **query,
+                'fingerprint': fingerprints[query['sql']],
+                'fingerprint_id': fingerprint_id(fingerprints[query['sql']]),
+                'duplicates': counts[fingerprints[query['sql']]],
+            }
+            for query in self.slow
+        ]
@@ -0,0 +1,213 @@
+import io
+import json
+import os
+import pstats
+import re
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from django.conf import settings
+from django.core.handlers import base
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from .log import JsonFormatter
+from .models import RequestProfile
+from .queries import fingerprint
+from users.models import User
+
+
+SAMPLE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+LABEL = re.compile(r'(\w+)="([^"]*)"')
+
+
+class MetricsTests(TestCase):
+
+    def sample(self, metrics, name, **labels):
+        """Sum of the samples of ``name`` with the given labels."""
+        labels = {key: str(value) for key, value in labels.items()}
+        total = 0.0
+        for line in metrics.splitlines():
+            match = SAMPLE.match(line)
+            if match and match[1] == name and labels.items() <= dict(
+                LABEL.findall(match[2])
+            ).items():
+                total += float(match[3])
+        return total
+
+    def test_requests_are_recorded_per_route_and_action(self):
+        before = self.client.get('/metrics').content.decode()
+        self.client.get('/api/tags/')
+        self.client.get('/api/tags/')
+        self.client.get('/no-such-page/')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        after = response.content.decode()
+        labels = {'route': 'tag-list:list', 'method': 'GET'}
+        for name, labels, delta in (
+            ('foodgram_http_requests_total', {**labels, 'status': 200}, 2),
+            ('foodgram_db_queries_per_request_count', labels, 2),
+            ('foodgram_http_response_size_bytes_count', labels, 2),
+            ('foodgram_http_requests_total', {'route': 'unmatched'}, 1),
+        ):
+            with self.subTest(name=name, labels=labels):
+                self.assertEqual(
+                    self.sample(after, name, **labels)
+                    - self.sample(before, name, **labels),
+                    delta,
+                )
+
+    def test_multiprocess_directory_is_created(self):
+        """Processes not started by gunicorn also get their metric files."""
+        script = (
+            'import django; django.setup()\n'
+            'from django.test import Client\n'
+            "print(Client().get('/no-such-page/').status_code)\n"
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            metrics = os.path.join(directory, 'metrics')
+            result = subprocess.run(
+                [sys.executable, '-c', script],
+                cwd=settings.BASE_DIR, capture_output=True, text=True,
+                env={
+                    **os.environ,
+                    'DJANGO_SETTINGS_MODULE': 'config.settings',
+                    'PROMETHEUS_MULTIPROC_DIR': metrics,
+                },
+            )
+            self.assertEqual(result.stdout.strip(), '404', result.stderr)
+            self.assertTrue(os.listdir(metrics))
+
+    async def test_async_requests_are_recorded(self):
+        before = (await self.async_client.get('/metrics')).content.decode()
+        response = await self.async_client.get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+        after = (await self.async_client.get('/metrics')).content.decode()
+        labels = {'route': 'tag-list:list', 'method': 'GET'}
+        for name in (
+            'foodgram_http_requests_total',
+            'foodgram_db_queries_per_request_sum',
+        ):
+            with self.subTest(name=name):
+                self.assertGreater(
+                    self.sample(after, name, **labels),
+                    self.sample(before, name, **labels),
+                )
+
+    @override_settings(DEBUG=True, SLOW_QUERY_THRESHOLD_MS=100.0)
+    def test_middleware_is_not_adapted_under_asgi(self):
+        with mock.patch.object(base.logger, 'debug') as debug:
+            ASGIHandler()
+        adapted = [
+            call.args for call in debug.call_args_list
+            if 'monitoring' in str(call.args)
+        ]
+        self.assertEqual(adapted, [])
+
+
+class ProfilingTests(APITestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(PROFILES_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user(
+            'staff', 'staff@example.com', 'password'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+
+    def test_staff_request_is_profiled(self):
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get('/api/recipes/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        record = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual(record.route, 'recipe-list:list')
+        self.assertEqual(record.query_count, len(record.queries))
+        self.assertTrue(record.queries)
+        self.assertNotIn(self.token.key, json.dumps(record.queries))
+        self.assertFalse(any('params' in query for query in record.queries))
+        stats = pstats.Stats(record.profile.path)
+        self.assertGreater(stats.total_calls, 0)
+        path = record.profile.path
+        record.delete()
+        self.assertFalse(record.profile.storage.exists(path))
+
+    async def test_async_staff_request_is_profiled(self):
+        self.user.is_staff = True
+        await sync_to_async(self.user.save)()
+        response = await self.async_client.get(
+            '/api/recipes/', AUTHORIZATION=f'Token {self.token.key}',
+            X_PROFILE='1',
+        )
+        self.assertEqual(response.status_code, 200)
+        record = await sync_to_async(RequestProfile.objects.get)(
+            pk=response['X-Profile-Id']
+        )
+        self.assertEqual(record.route, 'recipe-list:list')
+        self.assertEqual(record.query_count, len(record.queries))
+        self.assertTrue(record.queries)
+
+    def test_other_requests_are_not_profiled(self):
+        response = self.client.get('/api/recipes/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+
+@override_settings(SLOW_QUERY_THRESHOLD_MS=1e-6)
+class SlowQueryTests(APITestCase):
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint(
+                "SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x'"
+                ' LIMIT 21'
+            ),
+            fingerprint("SELECT * FROM t WHERE id IN (%s) AND name = 'y'"
+                        ' LIMIT 6'),
+        )
+
+    def test_slow_queries_are_logged_and_summarized(self):
+        user = User.objects.create_user(
+            'reader', 'reader@example.com', 'password'
+        )
+        self.client.force_authenticate(user)
+        with self.assertLogs('monitoring.slow_queries') as logs:
+            self.client.get('/api/users/subscriptions/')
+        entries = [
+            json.loads(JsonFormatter().format(record))
+            for record in logs.records
+        ]
+        for entry in entries:
+            self.assertEqual(
+                entry['route'], 'following-subscriptions:subscriptions'
+            )
+            self.assertEqual(entry['request_queries'], len(entries))
+            self.assertGreaterEqual(entry['duplicates'], 1)
+        self.assertIn(
+            'FollowViewSet.subscriptions',
+            {entry['function'] for entry in entries},
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'slow_queries.log')
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write('\n'.join(json.dumps(entry) for entry in entries))
+            output = io.StringIO()
+            call_command('slow_queries', path, '--json', stdout=output)
+        summary = json.loads(output.getvalue())
+        self.assertEqual(
+            sum(item['count'] for item in summary), len(entries)
+        )
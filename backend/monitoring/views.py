@@ -0,0 +1,9 @@
+from django.http import HttpResponse
+
+from .metrics import render
+
+
+def metrics(request):
+    """Prometheus scrape endpoint, not exposed by nginx."""
+    content, content_type = render()
+    return HttpResponse(content, content_type=content_type)
@@ -0,0 +1,123 @@
+import hashlib
+import io
+import os
+import uuid
+from pathlib import PurePosixPath
+
+from PIL import Image
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+# Bounding boxes of the derived images, aspect ratio is kept.
+VARIANTS = {
+    'thumbnail': (240, 240),
+    'card': (640, 480),
+    'detail': (1280, 960),
+}
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+QUALITY = 82
+
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def file_content_hash(file):
+    """Same as ``content_hash``, reading the file chunk by chunk."""
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Stores content-hash named files once: same name means same bytes.
+
+    Files are written under a temporary name, then renamed. Concurrent
+    saves of the same image thus never clash on the file Django opens
+    exclusively (which would make it retry under the same name forever),
+    and readers never see a partly written file.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+        path = PurePosixPath(name)
+        temporary = super()._save(
+            str(path.with_name(f'.{uuid.uuid4().hex}{path.suffix}')),
+            content,
+        )
+        os.replace(self.path(temporary), self.path(name))
+        return name
+
+
+def available_formats():
+    """WebP needs Pillow built with libwebp, which is usually the case."""
+    Image.init()
+    return {
+        extension: image_format for extension, image_format in FORMATS.items()
+        if image_format in Image.SAVE
+    }
+
+
+def variant_name(name, variant, extension):
+    path = PurePosixPath(name)
+    return str(path.with_name(f'{path.stem}_{variant}.{extension}'))
+
+
+def generate_variants(recipe):
+    """Renders the recipe image in every size and format, once per image.
+
+    Results are recorded in ``Recipe.image_variants`` together with the
+    source name, so unchanged images are skipped.
+    """
+    name = recipe.image.name
+    if not name or recipe.image_variants.get('source') == name:
+        return
+    storage = recipe.image.storage
+    with storage.open(name) as file:
+        source = Image.open(file)
+        source.load()
+    if source.mode not in ('RGB', 'RGBA'):
+        source = source.convert('RGBA')
+    variants = {'source': name}
+    for variant, size in VARIANTS.items():
+        image = source.copy()
+        image.thumbnail(size, Image.LANCZOS)
+        variants[variant] = {}
+        for extension, image_format in available_formats().items():
+            derived_name = variant_name(name, variant, extension)
+            if not storage.exists(derived_name):
+                converted = image
+                if image_format == 'JPEG' and image.mode == 'RGBA':
+                    converted = Image.new('RGB', image.size, 'white')
+                    converted.paste(image, mask=image.getchannel('A'))
+                buffer = io.BytesIO()
+                converted.save(buffer, image_format, quality=QUALITY)
+                storage.save(derived_name, ContentFile(buffer.getvalue()))
+            variants[variant][extension] = derived_name
+    recipe.image_variants = variants
+    recipe.save(update_fields=['image_variants', 'updated_at'])
+
+
+def variant_urls(recipe, build_url=None):
+    """URLs of the derived images; the original stands in until generated."""
+    variants = recipe.image_variants
+    storage = recipe.image.storage
+    build_url = build_url or (lambda url: url)
+    if variants.get('source') != recipe.image.name:
+        url = build_url(recipe.image.url) if recipe.image else None
+        return {variant: {'original': url} for variant in VARIANTS}
+    return {
+        variant: {
+            extension: build_url(storage.url(name))
+            for extension, name in variants[variant].items()
+        }
+        for variant in VARIANTS
+    }
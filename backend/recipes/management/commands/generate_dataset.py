@@ -0,0 +1,247 @@
+import io
+import random
+import time
+from itertools import accumulate, islice
+
+from PIL import Image
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from recipes.images import content_hash
+from recipes.models import (
+    FavouritesItem,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCartItem,
+    ShoppingListItem,
+    Tag,
+)
+from recipes.signals import bulk_changed
+from users.models import Follow, User
+
+
+FIXTURES = ('tags_dump.json', 'ingredients_dump.json')
+FIRST_NAMES = ('Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Сергей', 'Елена')
+LAST_NAMES = ('Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов')
+DISHES = ('Салат', 'Суп', 'Запеканка', 'Пирог', 'Рагу', 'Каша', 'Омлет')
+WORDS = (
+    'нарезать', 'смешать', 'обжарить', 'посолить', 'добавить', 'варить',
+    'минут', 'до', 'готовности', 'на', 'среднем', 'огне', 'подавать',
+    'горячим', 'с', 'зеленью',
+)
+# Typical amounts by measurement unit, anything else gets 1 to 5.
+AMOUNTS = {
+    'г': range(10, 510, 10),
+    'мл': range(50, 550, 50),
+    'кг': range(1, 3),
+    'шт.': range(1, 7),
+}
+
+
+def zipf_weights(size, exponent=1.1):
+    """Cumulative weights where a few items are far more popular."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)
+    ))
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Fills the database with synthetic users, follows, recipes,'
+        ' favourites and shopping carts for load testing. Popularity of'
+        ' authors, recipes and ingredients follows a Zipf distribution.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument(
+            '--recipes', type=int, help='Defaults to 2 per user.'
+        )
+        parser.add_argument(
+            '--follows', type=int, help='Defaults to 5 per user.'
+        )
+        parser.add_argument(
+            '--favourites', type=int, help='Defaults to 5 per user.'
+        )
+        parser.add_argument(
+            '--cart-items', type=int, help='Defaults to 2 per user.'
+        )
+        parser.add_argument('--ingredients-per-recipe', type=int, default=6)
+        parser.add_argument(
+            '--password', default='password',
+            help='Password of every generated user.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def bulk_create(self, model, objects, **kwargs):
+        created = []
+        for batch in batched(objects, self.batch_size):
+            created += model.objects.bulk_create(
+                batch, batch_size=self.batch_size, **kwargs
+            )
+        return created
+
+    def load_fixtures(self):
+        if not Tag.objects.exists() or not Ingredient.objects.exists():
+            call_command(
+                'loaddata',
+                *(settings.BASE_DIR / 'fixtures' / name for name in FIXTURES),
+                verbosity=0,
+            )
+
+    def placeholder_image(self):
+        """One content-addressed picture, shared by every recipe."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (1280, 960), '#E26C2D').save(buffer, 'JPEG')
+        content = buffer.getvalue()
+        field = Recipe._meta.get_field('image')
+        name = field.generate_filename(None, f'{content_hash(content)}.jpg')
+        return field.storage.save(name, ContentFile(content))
+
+    def create_users(self, count, password):
+        start = (User.objects.aggregate(Max('pk'))['pk__max'] or 0) + 1
+        password = make_password(password)
+        users = self.bulk_create(User, (
+            User(
+                username=f'user{number}',
+                email=f'user{number}@example.com',
+                first_name=self.random.choice(FIRST_NAMES),
+                last_name=self.random.choice(LAST_NAMES),
+                password=password,
+            )
+            for number in range(start, start + count)
+        ))
+        return [user.pk for user in users]
+
+    def create_recipes(self, count, authors, per_recipe):
+        ingredients = list(Ingredient.objects.values_list(
+            'pk', 'name', 'measurement_unit'
+        ))
+        self.random.shuffle(ingredients)
+        ingredient_weights = zipf_weights(len(ingredients))
+        tags = list(Tag.objects.values_list('pk', flat=True))
+        image = self.placeholder_image()
+        recipe_ids = []
+        for batch in batched(
+            self.random.choices(
+                authors, cum_weights=zipf_weights(len(authors)), k=count
+            ),
+            self.batch_size,
+        ):
+            compositions = []
+            for _ in batch:
+                size = max(1, round(self.random.gauss(per_recipe, 2)))
+                picked = self.random.choices(
+                    ingredients, cum_weights=ingredient_weights, k=size * 2
+                )
+                compositions.append(list(dict.fromkeys(picked))[:size])
+            recipes = Recipe.objects.bulk_create(
+                Recipe(
+                    author_id=author,
+                    name=(
+                        f'{self.random.choice(DISHES)}:'
+                        f' {composition[0][1]}'
+                    )[:200],
+                    text=' '.join(self.random.choices(WORDS, k=30)),
+                    cooking_time=self.random.randint(5, 180),
+                    image=image,
+                )
+                for author, composition in zip(batch, compositions)
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient_id=pk,
+                    amount=self.random.choice(AMOUNTS.get(unit, range(1, 6))),
+                )
+                for recipe, composition in zip(recipes, compositions)
+                for pk, _, unit in composition
+            )
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe=recipe, tag_id=tag)
+                for recipe in recipes
+                for tag in self.random.sample(
+                    tags, self.random.randint(1, min(3, len(tags)))
+                )
+            )
+            recipe_ids += [recipe.pk for recipe in recipes]
+        return recipe_ids
+
+    def create_follows(self, count, users):
+        weights = zipf_weights(len(users))
+        self.bulk_create(Follow, (
+            Follow(user_id=user, author_id=author)
+            for user, author in zip(
+                self.random.choices(users, k=count),
+                self.random.choices(users, cum_weights=weights, k=count),
+            )
+            if user != author
+        ), ignore_conflicts=True)
+
+    def fill_collections(self, model, count, users, recipes):
+        """Recipes picked by popularity for random users."""
+        self.bulk_create(model, (
+            model(user_id=user, recipe_id=recipe)
+            for user, recipe in zip(
+                self.random.choices(users, k=count),
+                self.random.choices(
+                    recipes, cum_weights=zipf_weights(len(recipes)), k=count
+                ),
+            )
+        ), ignore_conflicts=True)
+
+    def handle(self, *args, users, recipes, follows, favourites, cart_items,
+               ingredients_per_recipe, password, seed, batch_size,
+               **options):
+        if users < 2:
+            raise CommandError('Generate at least 2 users.')
+        recipes = users * 2 if recipes is None else recipes
+        follows = users * 5 if follows is None else follows
+        favourites = users * 5 if favourites is None else favourites
+        cart_items = users * 2 if cart_items is None else cart_items
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        started = time.perf_counter()
+        with transaction.atomic():
+            self.load_fixtures()
+            user_ids = self.create_users(users, password)
+            recipe_ids = self.create_recipes(
+                recipes, user_ids, ingredients_per_recipe
+            )
+            self.create_follows(follows, user_ids)
+            self.fill_collections(
+                FavouritesItem, favourites, user_ids, recipe_ids
+            )
+            self.fill_collections(
+                ShoppingCartItem, cart_items, user_ids, recipe_ids
+            )
+            for batch in batched(user_ids, 1000):
+                ShoppingListItem.objects.rebuild(batch)
+            # Also recounts the stats of the users and recipes.
+            bulk_changed.send(User, pks=user_ids)
+            bulk_changed.send(Recipe, pks=recipe_ids)
+        elapsed = time.perf_counter() - started
+        counts = {
+            model._meta.label: model.objects.count()
+            for model in (
+                User, Follow, Recipe, RecipeIngredient,
+                FavouritesItem, ShoppingCartItem, ShoppingListItem,
+            )
+        }
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated in {elapsed:.1f}s. Rows now: '
+            + ', '.join(f'{label} {count}' for label, count in counts.items())
+        ))
@@ -0,0 +1,121 @@
+import csv
+import io
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes.models import Ingredient
+from recipes.signals import bulk_changed
+
+
+FORMATS = ('csv', 'json', 'jsonl')
+MAX_LENGTH = Ingredient._meta.get_field('name').max_length
+
+
+def read_csv(file):
+    yield from csv.DictReader(file)
+
+
+def read_json(file):
+    """Plain ``[{name, measurement_unit}]`` lists and Django fixtures."""
+    for record in json.load(file):
+        yield record.get('fields', record)
+
+
+def read_jsonl(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports ingredients from CSV, JSON (lists or fixtures) or JSON Lines'
+        ' files, skipping (name, measurement_unit) pairs already present.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', type=Path)
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Defaults to the file extension.'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def rows(self, paths, file_format):
+        for path in paths:
+            reader = globals()[
+                f'read_{file_format or path.suffix.lstrip(".").lower()}'
+            ]
+            with path.open(encoding='utf-8', newline='') as file:
+                for record in reader(file):
+                    name = (record.get('name') or '').strip()
+                    unit = (record.get('measurement_unit') or '').strip()
+                    if not name or not unit:
+                        self.skipped += 1
+                        continue
+                    yield name[:MAX_LENGTH], unit[:MAX_LENGTH]
+
+    def write(self, batch):
+        if connection.vendor == 'postgresql':
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(batch)
+            buffer.seek(0)
+            with connection.cursor() as cursor:
+                cursor.copy_expert(
+                    'COPY recipes_ingredient (name, measurement_unit)'
+                    ' FROM STDIN WITH (FORMAT csv)',
+                    buffer,
+                )
+        else:
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=unit)
+                    for name, unit in batch
+                ),
+                batch_size=len(batch),
+            )
+
+    def handle(self, *args, paths, format, batch_size, **options):
+        for path in paths:
+            if not path.is_file():
+                raise CommandError(f'{path} is not a file.')
+            if not format and path.suffix.lstrip('.').lower() not in FORMATS:
+                raise CommandError(f'Unknown format of {path}, use --format.')
+        started = time.perf_counter()
+        self.skipped = read = 0
+        with transaction.atomic():
+            last_pk = Ingredient.objects.order_by('-pk').values_list(
+                'pk', flat=True
+            ).first() or 0
+            seen = set(
+                Ingredient.objects.values_list('name', 'measurement_unit')
+            )
+            batch = []
+            for row in self.rows(paths, format):
+                read += 1
+                if row in seen:
+                    continue
+                seen.add(row)
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    self.write(batch)
+                    batch = []
+            if batch:
+                self.write(batch)
+            created = list(
+                Ingredient.objects.filter(pk__gt=last_pk).values_list(
+                    'pk', flat=True
+                )
+            )
+            bulk_changed.send(Ingredient, pks=created)
+        elapsed = time.perf_counter() - started
+        rate = read / elapsed
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {read} rows in {elapsed:.2f}s ({rate:.0f} rows/s):'
+            f' {len(created)} imported, {read - len(created)} duplicates,'
+            f' {self.skipped} invalid.'
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Recipe
+from users.models import UserStats
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the counters kept up to date by signals: recipes,'
+        ' followers and cart size per user, favourites per recipe. Rows'
+        ' written bypassing the signals (raw SQL, fixtures) leave them'
+        ' off.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = UserStats.objects.recount()
+            recipes = Recipe.objects.recount_favorites()
+        self.stdout.write(self.style.SUCCESS(
+            f'Fixed {users} user counters and {recipes} recipe counters.'
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Ingredient, Recipe
+from recipes.search import get_search_backend
+from recipes.signals import bulk_changed
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds the search index of the SEARCH_BACKEND from the'
+        ' ingredient and recipe tables. Run it after switching backends:'
+        ' an index is only kept up to date while its backend is in use.'
+    )
+
+    def handle(self, *args, **options):
+        ingredients = list(Ingredient.objects.values_list('pk', flat=True))
+        recipes = list(Recipe.objects.values_list('pk', flat=True))
+        with transaction.atomic():
+            # Indexes on commit and bumps the versions of cached responses.
+            bulk_changed.send(Ingredient, pks=ingredients)
+            bulk_changed.send(Recipe, pks=recipes)
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(ingredients)} ingredients and {len(recipes)}'
+            f' recipes with {type(get_search_backend()).__name__}.'
+        ))
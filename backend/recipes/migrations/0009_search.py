@@ -0,0 +1,60 @@
+from django.db import migrations
+
+
+POSTGRESQL_FORWARD = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm'
+    ' ON recipes_ingredient USING gin (UPPER(name::text) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_name_trgm'
+    ' ON recipes_recipe USING gin (UPPER(name::text) gin_trgm_ops)',
+]
+POSTGRESQL_BACKWARD = [
+    'DROP INDEX IF EXISTS recipes_ingredient_name_trgm',
+    'DROP INDEX IF EXISTS recipes_recipe_name_trgm',
+]
+SQLITE_FORWARD = [
+    'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_ingredient_fts'
+    " USING fts5(name, tokenize='trigram')",
+    'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts'
+    ' USING fts5(name, text, ingredients)',
+    'INSERT INTO recipes_ingredient_fts (rowid, name)'
+    ' SELECT id, name FROM recipes_ingredient',
+    'INSERT INTO recipes_recipe_fts (rowid, name, text, ingredients)'
+    ' SELECT r.id, r.name, r.text, ('
+    "  SELECT coalesce(group_concat(i.name, ' '), '')"
+    '  FROM recipes_recipeingredient ri'
+    '  JOIN recipes_ingredient i ON i.id = ri.ingredient_id'
+    '  WHERE ri.recipe_id = r.id'
+    ' ) FROM recipes_recipe r',
+]
+SQLITE_BACKWARD = [
+    'DROP TABLE IF EXISTS recipes_ingredient_fts',
+    'DROP TABLE IF EXISTS recipes_recipe_fts',
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({
+                'postgresql': POSTGRESQL_FORWARD,
+                'sqlite': SQLITE_FORWARD,
+            }),
+            run_for_vendor({
+                'postgresql': POSTGRESQL_BACKWARD,
+                'sqlite': SQLITE_BACKWARD,
+            }),
+        ),
+    ]
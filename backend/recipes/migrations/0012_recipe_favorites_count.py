@@ -0,0 +1,28 @@
+# Generated by Django 4.0.1 on 2026-10-18 00:02
+
+from django.db import migrations, models
+
+
+def count_favourites(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(favorites_count=models.Subquery(
+        Recipe.objects.filter(pk=models.OuterRef('pk'))
+        .annotate(total=models.Count('favouritesitem'))
+        .values('total')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.RunPython(count_favourites, migrations.RunPython.noop),
+    ]
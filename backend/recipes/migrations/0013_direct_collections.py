@@ -0,0 +1,90 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_to_items(apps, schema_editor):
+    for container, item in (
+        ('ShoppingCart', 'ShoppingCartItem'),
+        ('FavouritesContainer', 'FavouritesItem'),
+    ):
+        through = apps.get_model('recipes', container).recipes.through
+        Item = apps.get_model('recipes', item)
+        Item.objects.bulk_create(
+            Item(user_id=user_id, recipe_id=recipe_id)
+            for user_id, recipe_id in through.objects.values_list(
+                f'{container.lower()}__user', 'recipe'
+            ).iterator()
+        )
+
+
+def copy_to_containers(apps, schema_editor):
+    for container, item in (
+        ('ShoppingCart', 'ShoppingCartItem'),
+        ('FavouritesContainer', 'FavouritesItem'),
+    ):
+        Container = apps.get_model('recipes', container)
+        Item = apps.get_model('recipes', item)
+        Container.objects.bulk_create(
+            Container(user_id=user_id) for user_id in
+            Item.objects.values_list('user', flat=True).distinct()
+        )
+        containers = dict(Container.objects.values_list('user', 'pk'))
+        through = Container.recipes.through
+        through.objects.bulk_create(
+            through(**{
+                f'{container.lower()}_id': containers[user_id],
+                'recipe_id': recipe_id,
+            })
+            for user_id, recipe_id in Item.objects.values_list(
+                'user', 'recipe'
+            ).iterator()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0012_recipe_favorites_count'),
+        ('users', '0002_userstats'),
+    ]
+
+    operations = [
+        migrations.RenameModel('FavouritesItem', 'FavouritesContainer'),
+        migrations.CreateModel(
+            name='ShoppingCartItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Рецепт в корзине',
+                'verbose_name_plural': 'Корзины',
+            },
+        ),
+        migrations.CreateModel(
+            name='FavouritesItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Избранное',
+                'verbose_name_plural': 'Избранное',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcartitem',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='recipe_unique_in_shopping_cart'),
+        ),
+        migrations.AddConstraint(
+            model_name='favouritesitem',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='recipe_unique_in_favourites'),
+        ),
+        migrations.RunPython(copy_to_items, copy_to_containers),
+        migrations.DeleteModel(name='ShoppingCart'),
+        migrations.DeleteModel(name='FavouritesContainer'),
+    ]
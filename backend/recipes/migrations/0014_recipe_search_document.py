@@ -0,0 +1,47 @@
+from django.db import migrations
+
+
+DOCUMENT = (
+    "setweight(to_tsvector('russian', r.name), 'A')"
+    " || setweight(to_tsvector('russian', r.text), 'B')"
+    " || setweight(to_tsvector('russian', coalesce(("
+    "  SELECT string_agg(i.name, ' ')"
+    '  FROM recipes_recipeingredient ri'
+    '  JOIN recipes_ingredient i ON i.id = ri.ingredient_id'
+    '  WHERE ri.recipe_id = r.id'
+    " ), '')), 'C')"
+)
+POSTGRESQL_FORWARD = [
+    'CREATE TABLE IF NOT EXISTS recipes_recipe_search ('
+    ' recipe_id bigint PRIMARY KEY'
+    ' REFERENCES recipes_recipe (id) ON DELETE CASCADE,'
+    ' document tsvector NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_search_document'
+    ' ON recipes_recipe_search USING gin (document)',
+    'INSERT INTO recipes_recipe_search (recipe_id, document)'
+    f' SELECT r.id, {DOCUMENT} FROM recipes_recipe r',
+]
+POSTGRESQL_BACKWARD = [
+    'DROP TABLE IF EXISTS recipes_recipe_search',
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_direct_collections'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({'postgresql': POSTGRESQL_FORWARD}),
+            run_for_vendor({'postgresql': POSTGRESQL_BACKWARD}),
+        ),
+    ]
@@ -1,7 +1,10 @@
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models.functions import RowNumber
+from django.dispatch import Signal
 
-from users.models import User
+from .images import ContentAddressedStorage
+from users.models import User, UserStats, annotate_is_subscribed
 
 
 class Tag(models.Model):
@@ -37,6 +40,79 @@ class Ingredient(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def with_user_flags(self, user):
+        """Annotates favourites & shopping cart membership for the user."""
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=models.Value(False),
+                is_in_shopping_cart=models.Value(False),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(
+                FavouritesItem.objects.filter(
+                    user=user, recipe=models.OuterRef('pk')
+                )
+            ),
+            is_in_shopping_cart=models.Exists(
+                ShoppingCartItem.objects.filter(
+                    user=user, recipe=models.OuterRef('pk')
+                )
+            ),
+        )
+
+    def with_related(self, user):
+        """Prefetches everything the full recipe representation reads.
+
+        The cost is fixed regardless of the number of recipes: one query
+        per prefetched relation, with the author subscription flag resolved
+        in the same query as the authors themselves.
+        """
+        return self.prefetch_related(
+            models.Prefetch(
+                'author',
+                queryset=annotate_is_subscribed(User.objects.all(), user),
+            ),
+            'tags',
+            models.Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.select_related('ingredient'),
+            ),
+        )
+
+    def recount_favorites(self):
+        """Recomputes ``favorites_count``, returns how many were off."""
+        actual = models.Subquery(
+            Recipe.objects.filter(pk=models.OuterRef('pk'))
+            .annotate(total=models.Count('favouritesitem'))
+            .values('total')
+        )
+        return self.exclude(favorites_count=actual).update(
+            favorites_count=actual
+        )
+
+    def latest_per_author(self, limit):
+        """Up to ``limit`` latest recipes of every author, in one query.
+
+        Recipes are ranked with ``ROW_NUMBER() OVER (PARTITION BY author)``;
+        Django can't filter on window functions yet, hence the raw wrapper.
+        """
+        ranked = self.annotate(
+            recipe_rank=models.Window(
+                RowNumber(),
+                partition_by=[models.F('author')],
+                order_by=models.F('id').desc(),
+            )
+        )
+        sql, params = ranked.query.sql_with_params()
+        return self.model.objects.raw(
+            f'SELECT * FROM ({sql}) ranked'
+            ' WHERE recipe_rank <= %s ORDER BY id DESC',
+            (*params, limit),
+        )
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User, on_delete=models.CASCADE,
@@ -49,12 +125,26 @@ class Recipe(models.Model):
     )
     tags = models.ManyToManyField(Tag, verbose_name='Теги')
     name = models.CharField(max_length=200, verbose_name='Название')
-    image = models.ImageField(verbose_name='Изображение')
+    image = models.ImageField(
+        upload_to='recipes/',
+        storage=ContentAddressedStorage(),
+        verbose_name='Изображение'
+    )
+    image_variants = models.JSONField(
+        default=dict, blank=True, editable=False,
+        verbose_name='Размеры изображения'
+    )
     text = models.TextField(verbose_name='Описание')
     cooking_time = models.IntegerField(
         verbose_name='Время приготовления',
         validators=[MinValueValidator(1)]
     )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Изменён')
+    favorites_count = models.IntegerField(
+        default=0, editable=False, verbose_name='В избранном'
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
@@ -93,37 +183,210 @@ class RecipeIngredient(models.Model):
                 f'{self.ingredient.measurement_unit}')
 
 
-class ShoppingCart(models.Model):
-    user = models.OneToOneField(
+# Sent by ``CollectionQuerySet`` with ``user_id``, ``recipe_ids`` and
+# ``sign``: 1 if the recipes were added to the collection, -1 if removed.
+collection_changed = Signal()
+
+
+class CollectionQuerySet(models.QuerySet):
+    """Single-statement changes of a user's collection of recipes.
+
+    Both methods return the ids of the recipes actually added or removed,
+    so concurrent requests can't add a recipe twice or both report its
+    removal, and send ``collection_changed`` for them.
+    """
+
+    def add(self, user, recipe_ids):
+        """``INSERT ... ON CONFLICT DO NOTHING`` of the (existing) recipes."""
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        rows = ', '.join(['(%s, %s)'] * len(recipe_ids))
+        return self.change(
+            f'INSERT INTO {{table}} ({{user}}, {{recipe}}) VALUES {rows}'
+            ' ON CONFLICT DO NOTHING RETURNING {recipe}',
+            [value for pk in recipe_ids for value in (user.pk, pk)],
+            user, 1,
+        )
+
+    def remove(self, user, recipe_ids):
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        return self.change(
+            'DELETE FROM {table} WHERE {user} = %s'
+            f' AND {{recipe}} IN ({placeholders}) RETURNING {{recipe}}',
+            [user.pk, *recipe_ids],
+            user, -1,
+        )
+
+    def change(self, sql, params, user, sign):
+        if len(params) < 2:
+            return []
+        opts = self.model._meta
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        sql = sql.format(
+            table=quote(opts.db_table),
+            user=quote(opts.get_field('user').column),
+            recipe=quote(opts.get_field('recipe').column),
+        )
+        with transaction.atomic(using=self.db):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                recipe_ids = [pk for pk, in cursor.fetchall()]
+            if recipe_ids:
+                collection_changed.send(
+                    self.model, user_id=user.pk, recipe_ids=recipe_ids,
+                    sign=sign,
+                )
+        return recipe_ids
+
+
+class ShoppingCartItem(models.Model):
+    """Recipe in the user's shopping cart.
+
+    Change carts with ``add`` and ``remove`` of the manager: they keep the
+    shopping lists and counters up to date.
+    """
+
+    user = models.ForeignKey(
         User, on_delete=models.CASCADE, verbose_name='Пользователь'
     )
-    recipes = models.ManyToManyField(
-        Recipe, verbose_name='Рецепт'
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, verbose_name='Рецепт'
     )
 
+    objects = CollectionQuerySet.as_manager()
+
     class Meta:
-        verbose_name = 'Корзина'
+        verbose_name = 'Рецепт в корзине'
         verbose_name_plural = 'Корзины'
         constraints = [
             models.UniqueConstraint(
-                fields=['user'],
-                name='shopping_cart_unique_for_user'
+                fields=['user', 'recipe'],
+                name='recipe_unique_in_shopping_cart'
             ),
         ]
 
 
 class FavouritesItem(models.Model):
-    user = models.OneToOneField(
+    """Recipe in the user's favourites, see ``ShoppingCartItem``."""
+
+    user = models.ForeignKey(
         User, on_delete=models.CASCADE, verbose_name='Пользователь'
     )
-    recipes = models.ManyToManyField(Recipe, verbose_name='Рецепт')
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, verbose_name='Рецепт'
+    )
+
+    objects = CollectionQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
         constraints = [
             models.UniqueConstraint(
-                fields=['user'],
-                name='favourites_unique_for_user'
+                fields=['user', 'recipe'],
+                name='recipe_unique_in_favourites'
+            ),
+        ]
+
+
+class ShoppingListQuerySet(models.QuerySet):
+
+    def apply(self, user_ids, deltas):
+        """Adds ``{ingredient_id: amount}`` deltas to the users' lists.
+
+        Three statements whatever the number of users and ingredients: an
+        update of the existing rows, an insert of the new ones and a delete
+        of the ones that dropped to zero.
+        """
+        user_ids = list(user_ids)
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        if not user_ids or not deltas:
+            return
+        with transaction.atomic():
+            lists = self.filter(user__in=user_ids)
+            lists.filter(ingredient__in=deltas).update(
+                total=models.F('total') + models.Case(
+                    *(
+                        models.When(ingredient=ingredient_id, then=delta)
+                        for ingredient_id, delta in deltas.items()
+                    ),
+                    output_field=models.IntegerField(),
+                )
+            )
+            self.bulk_create(
+                [
+                    self.model(
+                        user_id=user_id, ingredient_id=ingredient_id,
+                        total=delta
+                    )
+                    for user_id in user_ids
+                    for ingredient_id, delta in deltas.items()
+                    if delta > 0
+                ],
+                ignore_conflicts=True,
+            )
+            lists.filter(total__lte=0).delete()
+
+    def apply_recipes(self, user_ids, recipe_ids, sign=1):
+        """Adds (or, with ``sign=-1``, subtracts) recipes to the lists."""
+        amounts = (
+            RecipeIngredient.objects.filter(recipe__in=recipe_ids)
+            .values_list('ingredient')
+            .annotate(models.Sum('amount'))
+        )
+        self.apply(
+            user_ids,
+            {ingredient_id: sign * amount for ingredient_id, amount in amounts}
+        )
+
+    def rebuild(self, user_ids):
+        """Recomputes the lists of the users from their carts.
+
+        The users' counters rows are locked first, as cart changes update
+        them before the lists, so a concurrent change is either fully seen
+        by the rebuild or applied on top of it.
+        """
+        with transaction.atomic():
+            list(
+                UserStats.objects.select_for_update()
+                .filter(user__in=user_ids).order_by('pk').values_list('pk')
+            )
+            self.filter(user__in=user_ids).delete()
+            totals = (
+                RecipeIngredient.objects
+                .filter(recipe__shoppingcartitem__user__in=user_ids)
+                .values_list('recipe__shoppingcartitem__user', 'ingredient')
+                .annotate(models.Sum('amount'))
+            )
+            self.bulk_create(
+                self.model(
+                    user_id=user_id, ingredient_id=ingredient_id, total=total
+                )
+                for user_id, ingredient_id, total in totals
+            )
+
+
+class ShoppingListItem(models.Model):
+    """Ingredient total over the user's shopping cart, kept up to date."""
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='shopping_list', verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE, verbose_name='Ингредиент'
+    )
+    total = models.IntegerField(verbose_name='Количество')
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Список покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='ingredient_unique_in_shopping_list'
             ),
         ]
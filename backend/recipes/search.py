@@ -0,0 +1,241 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, FloatField, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from django.utils.module_loading import import_string
+
+from .models import RecipeIngredient
+
+
+class SearchBackend:
+    """Plain ``icontains`` matching, available on every database.
+
+    Backends with an index of their own keep it in sync through the
+    ``index_*``/``remove_*`` hooks, called from ``recipes.signals``.
+    """
+
+    def search_ingredients(self, queryset, value):
+        """Ingredients containing the value, the ones starting with it first.
+        """
+        return queryset.filter(name__icontains=value).annotate(
+            order=Case(
+                When(name__istartswith=value, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by('order', 'name')
+
+    def search_recipes(self, queryset, value):
+        """Recipes mentioning the value in the name, text or ingredients."""
+        return queryset.filter(
+            Q(name__icontains=value)
+            | Q(text__icontains=value)
+            | Q(pk__in=RecipeIngredient.objects.filter(
+                ingredient__name__icontains=value
+            ).values('recipe'))
+        )
+
+    def index_ingredients(self, pks):
+        pass
+
+    def remove_ingredients(self, pks):
+        pass
+
+    def index_recipes(self, pks):
+        pass
+
+    def remove_recipes(self, pks):
+        pass
+
+
+class PostgreSQLSearchBackend(SearchBackend):
+    """Full-text search with ranking and ``pg_trgm`` accelerated matching.
+
+    ``icontains`` lookups on ingredient and recipe names are served by the
+    trigram GIN indexes from the ``0009_search`` migration. Recipes are
+    matched against the weighted ``tsvector`` documents (name, text, then
+    ingredients) stored in the GIN-indexed table of the
+    ``0014_recipe_search_document`` migration, kept up to date like the
+    SQLite FTS tables.
+
+    Not picked automatically: enable it with ``SEARCH_BACKEND`` once its
+    tests pass against the production server, after ``reindex_search``
+    has brought the documents written meanwhile up to date.
+    """
+
+    config = 'russian'
+    recipe_table = 'recipes_recipe_search'
+    document = (
+        "setweight(to_tsvector(%s::regconfig, r.name), 'A')"
+        " || setweight(to_tsvector(%s::regconfig, r.text), 'B')"
+        " || setweight(to_tsvector(%s::regconfig, coalesce(("
+        "  SELECT string_agg(i.name, ' ')"
+        '  FROM recipes_recipeingredient ri'
+        '  JOIN recipes_ingredient i ON i.id = ri.ingredient_id'
+        '  WHERE ri.recipe_id = r.id'
+        " ), '')), 'C')"
+    )
+
+    def search_ingredients(self, queryset, value):
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        return super().search_ingredients(queryset, value).annotate(
+            similarity=TrigramSimilarity('name', value)
+        ).order_by('order', '-similarity', 'name')
+
+    def search_recipes(self, queryset, value):
+        """Documents matching the words or names containing the value.
+
+        Both sides of the ``UNION`` are index scans, and only the matched
+        recipes are ranked.
+        """
+        query = 'plainto_tsquery(%s::regconfig, %s)'
+        by_name, name_params = (
+            queryset.model.objects.filter(name__icontains=value)
+            .order_by().values('pk').query.sql_with_params()
+        )
+        matches = RawSQL(
+            f'SELECT recipe_id FROM {self.recipe_table}'
+            f' WHERE document @@ {query} UNION {by_name}',
+            (self.config, value, *name_params),
+        )
+        rank = RawSQL(
+            f'SELECT ts_rank(document, {query}) FROM {self.recipe_table}'
+            f' WHERE recipe_id = recipes_recipe.id',
+            (self.config, value),
+            output_field=FloatField(),
+        )
+        return queryset.filter(pk__in=matches).annotate(
+            search_rank=Coalesce(rank, 0.0)
+        ).order_by('-search_rank', '-id')
+
+    def index_recipes(self, pks):
+        """The pks are bound as one array, whatever their number."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.recipe_table} (recipe_id, document)'
+                f' SELECT r.id, {self.document} FROM recipes_recipe r'
+                ' WHERE r.id = ANY(%s)'
+                ' ON CONFLICT (recipe_id)'
+                ' DO UPDATE SET document = EXCLUDED.document',
+                [self.config] * 3 + [list(pks)],
+            )
+
+    def remove_recipes(self, pks):
+        """Rows of deleted recipes also go with ``ON DELETE CASCADE``."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.recipe_table} WHERE recipe_id = ANY(%s)',
+                [list(pks)],
+            )
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """FTS5 search over the tables created by the ``0009_search`` migration.
+
+    Ingredient names use the trigram tokenizer, which keeps substring
+    semantics for queries of three and more characters; recipes are matched
+    by word prefixes and ranked with bm25 (name, then ingredients, then
+    text).
+    """
+
+    ingredient_table = 'recipes_ingredient_fts'
+    recipe_table = 'recipes_recipe_fts'
+    recipe_weights = (10.0, 1.0, 5.0)
+
+    @staticmethod
+    def quote(term):
+        return '"{}"'.format(term.replace('"', '""'))
+
+    chunk_size = 500
+
+    @classmethod
+    def _execute(cls, sql, pks):
+        """Runs the statement for the pks, in chunks of bound parameters."""
+        pks = list(pks)
+        with connection.cursor() as cursor:
+            for start in range(0, len(pks), cls.chunk_size):
+                chunk = pks[start:start + cls.chunk_size]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(sql.format(pks=placeholders), chunk)
+
+    def search_ingredients(self, queryset, value):
+        if len(value) < 3:
+            return super().search_ingredients(queryset, value)
+        matches = RawSQL(
+            f'SELECT rowid FROM {self.ingredient_table}'
+            f' WHERE {self.ingredient_table} MATCH %s',
+            [self.quote(value)],
+        )
+        return queryset.filter(pk__in=matches).annotate(
+            order=Case(
+                When(name__istartswith=value, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by('order', 'name')
+
+    def search_recipes(self, queryset, value):
+        terms = ' '.join(self.quote(term) + '*' for term in value.split())
+        if not terms:
+            return queryset
+        weights = ', '.join(map(str, self.recipe_weights))
+        rank = RawSQL(
+            f'SELECT bm25({self.recipe_table}, {weights})'
+            f' FROM {self.recipe_table}'
+            f' WHERE {self.recipe_table} MATCH %s'
+            f' AND {self.recipe_table}.rowid = recipes_recipe.id',
+            [terms],
+        )
+        return queryset.annotate(search_rank=rank).filter(
+            search_rank__isnull=False
+        ).order_by('search_rank', '-id')
+
+    def index_ingredients(self, pks):
+        self.remove_ingredients(pks)
+        self._execute(
+            f'INSERT INTO {self.ingredient_table} (rowid, name)'
+            ' SELECT id, name FROM recipes_ingredient WHERE id IN ({pks})',
+            pks,
+        )
+
+    def remove_ingredients(self, pks):
+        self._execute(
+            f'DELETE FROM {self.ingredient_table} WHERE rowid IN ({{pks}})',
+            pks,
+        )
+
+    def index_recipes(self, pks):
+        self.remove_recipes(pks)
+        self._execute(
+            f'INSERT INTO {self.recipe_table} (rowid, name, text, ingredients)'
+            ' SELECT r.id, r.name, r.text, ('
+            "  SELECT coalesce(group_concat(i.name, ' '), '')"
+            '  FROM recipes_recipeingredient ri'
+            '  JOIN recipes_ingredient i ON i.id = ri.ingredient_id'
+            '  WHERE ri.recipe_id = r.id'
+            ' ) FROM recipes_recipe r WHERE r.id IN ({pks})',
+            pks,
+        )
+
+    def remove_recipes(self, pks):
+        self._execute(
+            f'DELETE FROM {self.recipe_table} WHERE rowid IN ({{pks}})',
+            pks,
+        )
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    """Returns the ``SEARCH_BACKEND`` setting or the database's default."""
+    if settings.SEARCH_BACKEND:
+        return import_string(settings.SEARCH_BACKEND)()
+    return BACKENDS.get(connection.vendor, SearchBackend)()
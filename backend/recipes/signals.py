@@ -0,0 +1,125 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from .models import (
+    FavouritesItem,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCartItem,
+    ShoppingListItem,
+    collection_changed,
+)
+from .search import get_search_backend
+from users.models import User, UserStats
+
+
+# Sent with ``pks`` after bulk writes that bypass the model signals.
+bulk_changed = Signal()
+
+
+@receiver(collection_changed, sender=ShoppingCartItem)
+def update_shopping_list(sender, user_id, recipe_ids, sign, **kwargs):
+    """Keeps the shopping list aggregate and the cart size in line.
+
+    The counter goes first: its row lock orders the change against
+    ``ShoppingListQuerySet.rebuild``.
+    """
+    UserStats.objects.add([user_id], cart_size=sign * len(recipe_ids))
+    ShoppingListItem.objects.apply_recipes([user_id], recipe_ids, sign)
+
+
+@receiver(collection_changed, sender=FavouritesItem)
+def count_favourites(sender, recipe_ids, sign, **kwargs):
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        favorites_count=F('favorites_count') + sign
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_deleted_recipe_from_shopping_lists(sender, instance, **kwargs):
+    """Deleted recipes leave carts without a ``collection_changed``."""
+    user_ids = list(
+        ShoppingCartItem.objects.filter(recipe=instance).values_list(
+            'user', flat=True
+        )
+    )
+    UserStats.objects.add(user_ids, cart_size=-1)
+    ShoppingListItem.objects.apply_recipes(user_ids, [instance.pk], -1)
+
+
+@receiver(pre_delete, sender=User)
+def uncount_deleted_user_favourites(sender, instance, **kwargs):
+    Recipe.objects.filter(favouritesitem__user=instance).update(
+        favorites_count=F('favorites_count') - 1
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def count_new_recipe(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        UserStats.objects.add([instance.author_id], recipes_count=1)
+
+
+@receiver(post_delete, sender=Recipe)
+def count_deleted_recipe(sender, instance, **kwargs):
+    UserStats.objects.add([instance.author_id], recipes_count=-1)
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, **kwargs):
+    """Indexes the recipe once its ingredients are written, too."""
+    transaction.on_commit(
+        lambda: get_search_backend().index_recipes([instance.pk])
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, **kwargs):
+    get_search_backend().remove_recipes([instance.pk])
+
+
+@receiver(post_save, sender=Ingredient)
+def index_ingredient(sender, instance, **kwargs):
+    def index():
+        backend = get_search_backend()
+        backend.index_ingredients([instance.pk])
+        backend.index_recipes(
+            RecipeIngredient.objects.filter(ingredient=instance)
+            .values_list('recipe', flat=True)
+        )
+    transaction.on_commit(index)
+
+
+@receiver(post_delete, sender=Ingredient)
+def unindex_ingredient(sender, instance, **kwargs):
+    get_search_backend().remove_ingredients([instance.pk])
+
+
+@receiver(bulk_changed, sender=Ingredient)
+def index_bulk_ingredients(sender, pks, **kwargs):
+    transaction.on_commit(lambda: get_search_backend().index_ingredients(pks))
+
+
+@receiver(bulk_changed, sender=Recipe)
+def index_bulk_recipes(sender, pks, **kwargs):
+    transaction.on_commit(lambda: get_search_backend().index_recipes(pks))
+
+
+def batches(pks, size=1000):
+    pks = list(pks)
+    return (pks[start:start + size] for start in range(0, len(pks), size))
+
+
+@receiver(bulk_changed, sender=Recipe)
+def recount_bulk_recipes(sender, pks, **kwargs):
+    for batch in batches(pks):
+        Recipe.objects.filter(pk__in=batch).recount_favorites()
+
+
+@receiver(bulk_changed, sender=User)
+def recount_bulk_users(sender, pks, **kwargs):
+    for batch in batches(pks):
+        UserStats.objects.recount(batch)
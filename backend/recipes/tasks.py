@@ -0,0 +1,25 @@
+from tasks.queue import task
+from .images import generate_variants
+from .models import Recipe, ShoppingCartItem, ShoppingListItem
+from .signals import batches
+
+
+@task
+def generate_image_variants(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is not None:
+        generate_variants(recipe)
+
+
+@task
+def rebuild_shopping_lists(recipe_id):
+    """Rebuilds the lists of the users having the recipe in their cart.
+
+    Lists are recomputed from the carts rather than shifted by the amount
+    changes, so the task stays correct when it runs late or more than once.
+    """
+    user_ids = ShoppingCartItem.objects.filter(recipe=recipe_id).values_list(
+        'user', flat=True
+    )
+    for batch in batches(user_ids):
+        ShoppingListItem.objects.rebuild(batch)
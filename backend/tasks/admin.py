@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = (
+        'name', 'args', 'status', 'attempts', 'created_at', 'claimed_at'
+    )
+    list_filter = ('status', 'name')
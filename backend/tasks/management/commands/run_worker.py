@@ -0,0 +1,48 @@
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from tasks.queue import claim, run
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background tasks in a pool of threads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds to sleep when the queue is empty.'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once the queue is empty.'
+        )
+
+    def run_task(self, task_row):
+        try:
+            task_row = run(task_row)
+            self.stdout.write(f'{task_row} {task_row.status}')
+        finally:
+            connection.close()
+
+    def handle(self, *args, threads, poll_interval, once, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            while not self.stopping:
+                close_old_connections()
+                claimed = claim(threads)
+                if claimed:
+                    list(pool.map(self.run_task, claimed))
+                elif once:
+                    break
+                else:
+                    time.sleep(poll_interval)
+
+    def stop(self, signum, frame):
+        self.stopping = True
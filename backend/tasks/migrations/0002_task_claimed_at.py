@@ -0,0 +1,35 @@
+# Generated by Django 4.0.1 on 2026-10-18 00:28
+
+from django.db import migrations, models
+
+
+def rebuild_instead_of_deltas(apps, schema_editor):
+    """Queued amount deltas become rebuilds of the recipe's carts."""
+    Task = apps.get_model('tasks', 'Task')
+    queued = Task.objects.filter(
+        name='recipes.tasks.apply_recipe_changes',
+        status__in=['pending', 'running'],
+    )
+    for task in queued:
+        task.name = 'recipes.tasks.rebuild_shopping_lists'
+        task.args = task.args[:1]
+        task.status = 'pending'
+        task.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Взята в работу'),
+        ),
+        migrations.RunPython(
+            rebuild_instead_of_deltas, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.0.1 on 2026-10-18 12:30
+
+from django.db import migrations
+
+
+def drop_base_url(apps, schema_editor):
+    """Recipe fragments no longer depend on the URL they were written at."""
+    Task = apps.get_model('tasks', 'Task')
+    queued = Task.objects.filter(
+        name='api.tasks.prepare_recipe', status__in=['pending', 'running'],
+    )
+    for task in queued:
+        task.args = task.args[:1]
+        task.save(update_fields=['args'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0002_task_claimed_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_base_url, migrations.RunPython.noop),
+    ]
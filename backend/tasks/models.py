@@ -0,0 +1,50 @@
+from django.db import models
+
+
+class Task(models.Model):
+    """Deferred function call, picked up by ``manage.py run_worker``."""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(max_length=200, verbose_name='Функция')
+    args = models.JSONField(default=list, verbose_name='Аргументы')
+    status = models.CharField(
+        max_length=10, choices=STATUSES, default=PENDING,
+        verbose_name='Статус'
+    )
+    attempts = models.PositiveIntegerField(
+        default=0, verbose_name='Попытки'
+    )
+    run_after = models.DateTimeField(verbose_name='Не раньше')
+    claimed_at = models.DateTimeField(
+        null=True, blank=True, verbose_name='Взята в работу'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True, verbose_name='Создана'
+    )
+    finished_at = models.DateTimeField(
+        null=True, blank=True, verbose_name='Завершена'
+    )
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ['-id']
+        indexes = [
+            models.Index(
+                fields=['status', 'run_after'], name='task_status_run_after'
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.name}{tuple(self.args)}'
@@ -0,0 +1,96 @@
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+
+registry = {}
+
+
+def task(func):
+    """Registers the function and adds ``func.delay(*args)`` to queue it.
+
+    Arguments must be JSON serializable. The task row is written in the
+    caller's transaction, so workers only see it once the data it refers
+    to is committed. With ``TASKS_EAGER`` the call runs on commit instead.
+    """
+    name = f'{func.__module__}.{func.__qualname__}'
+    registry[name] = func
+
+    def delay(*args):
+        if settings.TASKS_EAGER:
+            transaction.on_commit(lambda: func(*args))
+            return None
+        return Task.objects.create(
+            name=name, args=list(args), run_after=timezone.now()
+        )
+
+    func.delay = delay
+    return func
+
+
+def claim(limit):
+    """Marks up to ``limit`` due tasks as running and returns them.
+
+    Due are pending tasks past ``run_after`` and running ones claimed more
+    than ``TASKS_LEASE`` seconds ago, whose worker must have died. Every
+    claim counts as an attempt. The conditional update makes claiming safe
+    across several workers without row locks, which SQLite doesn't have.
+    """
+    now = timezone.now()
+    candidates = Task.objects.filter(
+        Q(status=Task.PENDING, run_after__lte=now)
+        | Q(
+            status=Task.RUNNING,
+            claimed_at__lt=now - timedelta(seconds=settings.TASKS_LEASE),
+        )
+    ).order_by('run_after', 'id').values_list(
+        'pk', 'status', 'claimed_at'
+    )[:limit]
+    claimed = [
+        pk for pk, status, claimed_at in candidates
+        if Task.objects.filter(
+            pk=pk, status=status, claimed_at=claimed_at
+        ).update(
+            status=Task.RUNNING, claimed_at=now, attempts=F('attempts') + 1
+        )
+    ]
+    return list(Task.objects.filter(pk__in=claimed))
+
+
+def run(task_row):
+    """Runs a claimed task, rescheduling it with a backoff on failure.
+
+    A task reclaimed after its last attempt died with the worker fails
+    without running again.
+    """
+    if task_row.attempts > settings.TASKS_MAX_ATTEMPTS:
+        task_row.status = Task.FAILED
+        task_row.finished_at = timezone.now()
+        task_row.error = 'Воркер остановился, не завершив задачу.'
+        task_row.save(update_fields=['status', 'finished_at', 'error'])
+        return task_row
+    try:
+        registry[task_row.name](*task_row.args)
+    except Exception:
+        task_row.error = traceback.format_exc()
+        if task_row.attempts < settings.TASKS_MAX_ATTEMPTS:
+            task_row.status = Task.PENDING
+            task_row.run_after = timezone.now() + timedelta(
+                seconds=2 ** task_row.attempts
+            )
+        else:
+            task_row.status = Task.FAILED
+            task_row.finished_at = timezone.now()
+    else:
+        task_row.status = Task.DONE
+        task_row.finished_at = timezone.now()
+    task_row.save(update_fields=[
+        'status', 'run_after', 'finished_at', 'error'
+    ])
+    return task_row
@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Task
+from .queue import claim, run, task
+
+
+calls = []
+
+
+@task
+def flaky(fail):
+    calls.append(fail)
+    if fail:
+        raise ValueError('flaky')
+
+
+@override_settings(TASKS_EAGER=False, TASKS_MAX_ATTEMPTS=3, TASKS_LEASE=60)
+class QueueTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def make_due(self, task_row, **changes):
+        Task.objects.filter(pk=task_row.pk).update(
+            run_after=timezone.now(), **changes
+        )
+
+    def test_success(self):
+        flaky.delay(False)
+        task_row, = claim(10)
+        self.assertEqual(run(task_row).status, Task.DONE)
+        self.assertEqual((calls, task_row.attempts), ([False], 1))
+        self.assertEqual(claim(10), [])
+
+    def test_retry_with_backoff(self):
+        task_row = flaky.delay(True)
+        for attempt in (1, 2):
+            task_row, = claim(10)
+            started = timezone.now()
+            task_row = run(task_row)
+            self.assertEqual(
+                (task_row.status, task_row.attempts), (Task.PENDING, attempt)
+            )
+            self.assertIn('ValueError: flaky', task_row.error)
+            self.assertGreaterEqual(
+                task_row.run_after, started + timedelta(seconds=2 ** attempt)
+            )
+            self.assertEqual(claim(10), [])
+            self.make_due(task_row)
+        task_row, = claim(10)
+        self.assertEqual(run(task_row).status, Task.FAILED)
+        self.assertEqual(len(calls), 3)
+
+    def test_lost_tasks_are_reclaimed(self):
+        """A worker died on the task: it runs again once the lease ends."""
+        task_row = flaky.delay(False)
+        claimed_at = claim(10)[0].claimed_at
+        self.assertEqual(claim(10), [])
+        self.make_due(task_row, claimed_at=claimed_at - timedelta(minutes=2))
+        task_row, = claim(10)
+        self.assertEqual(task_row.attempts, 2)
+        self.assertEqual(run(task_row).status, Task.DONE)
+
+    def test_lost_last_attempt_fails(self):
+        task_row = flaky.delay(False)
+        self.make_due(
+            task_row, status=Task.RUNNING, attempts=3,
+            claimed_at=timezone.now() - timedelta(minutes=2),
+        )
+        task_row, = claim(10)
+        self.assertEqual(run(task_row).status, Task.FAILED)
+        self.assertEqual(calls, [])
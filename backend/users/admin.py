@@ -1,8 +1,15 @@
 from django.contrib import admin
 
-from .models import Follow
+from .models import Follow, UserStats
 
 
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):
     fields = (('user', 'following'),)
+
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'recipes_count', 'followers_count', 'cart_size')
+    search_fields = ('user__username', 'user__email')
+    readonly_fields = list_display
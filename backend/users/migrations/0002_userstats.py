@@ -0,0 +1,49 @@
+# Generated by Django 4.0.1 on 2026-10-18 00:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_stats(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    UserStats = apps.get_model('users', 'UserStats')
+    UserStats.objects.bulk_create(
+        UserStats(user_id=pk) for pk in User.objects.values_list('pk', flat=True)
+    )
+    for name, relation in (
+        ('recipes_count', 'recipes'),
+        ('followers_count', 'followers'),
+        ('cart_size', 'shoppingcart__recipes'),
+    ):
+        UserStats.objects.update(**{name: models.Subquery(
+            User.objects.filter(pk=models.OuterRef('user'))
+            .annotate(total=models.Count(relation))
+            .values('total')
+        )})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0012_recipe_favorites_count'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('recipes_count', models.IntegerField(default=0, verbose_name='Рецептов')),
+                ('followers_count', models.IntegerField(default=0, verbose_name='Подписчиков')),
+                ('cart_size', models.IntegerField(default=0, verbose_name='Рецептов в корзине')),
+            ],
+            options={
+                'verbose_name': 'Статистика пользователя',
+                'verbose_name_plural': 'Статистика пользователей',
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
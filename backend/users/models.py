@@ -27,3 +27,85 @@ class Follow(models.Model):
 
     def __str__(self) -> str:
         return f'{self.user} подписан на {self.author}'
+
+
+def annotate_is_subscribed(queryset, user):
+    """Аннотирует пользователей флагом подписки на них ``user``."""
+    if not user.is_authenticated:
+        return queryset.annotate(is_subscribed=models.Value(False))
+    return queryset.annotate(
+        is_subscribed=models.Exists(
+            Follow.objects.filter(user=user, author=models.OuterRef('pk'))
+        )
+    )
+
+
+# Счётчик -> связь пользователя, по которой он считается.
+COUNTED_RELATIONS = {
+    'recipes_count': 'recipes',
+    'followers_count': 'followers',
+    'cart_size': 'shoppingcartitem',
+}
+
+
+class UserStatsQuerySet(models.QuerySet):
+
+    def add(self, user_ids, **deltas):
+        """Прибавляет ``deltas`` к счётчикам пользователей одним UPDATE."""
+        self.filter(user__in=user_ids).update(**{
+            name: models.F(name) + delta for name, delta in deltas.items()
+        })
+
+    def recount(self, user_ids=None):
+        """Создаёт недостающие строки и пересчитывает счётчики.
+
+        Возвращает число исправленных значений.
+        """
+        users = User.objects.all()
+        if user_ids is not None:
+            users = users.filter(pk__in=user_ids)
+        self.bulk_create(
+            [
+                self.model(user_id=pk) for pk in
+                users.filter(stats__isnull=True).values_list('pk', flat=True)
+            ],
+            ignore_conflicts=True,
+        )
+        stats = self.filter(user__in=users.values('pk'))
+        fixed = 0
+        for name, relation in COUNTED_RELATIONS.items():
+            actual = models.Subquery(
+                User.objects.filter(pk=models.OuterRef('user'))
+                .annotate(total=models.Count(relation))
+                .values('total')
+            )
+            fixed += stats.exclude(**{name: actual}).update(**{name: actual})
+        return fixed
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, обновляемые сигналами.
+
+    Исправляются командой ``manage.py recount``.
+    """
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True,
+        related_name='stats', verbose_name='Пользователь'
+    )
+    recipes_count = models.IntegerField(default=0, verbose_name='Рецептов')
+    followers_count = models.IntegerField(
+        default=0, verbose_name='Подписчиков'
+    )
+    cart_size = models.IntegerField(
+        default=0, verbose_name='Рецептов в корзине'
+    )
+
+    objects = UserStatsQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self) -> str:
+        return str(self.user)
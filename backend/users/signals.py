@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Follow, User, UserStats
+
+
+@receiver(post_save, sender=User)
+def create_stats(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        UserStats.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follower(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        UserStats.objects.add([instance.author_id], followers_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_lost_follower(sender, instance, **kwargs):
+    UserStats.objects.add([instance.author_id], followers_count=-1)